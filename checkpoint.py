@@ -0,0 +1,137 @@
+# scripts/checkpoint.py
+
+import argparse
+import os
+import threading
+import time
+
+import numpy as np
+
+CHECKPOINT_DIR = os.path.join("cache", "checkpoints")
+FLUSH_INTERVAL_S = 5.0
+
+# One record per conformer; energy stays NaN until it has been scored
+CHECKPOINT_DTYPE = np.dtype(
+    [("done", np.bool_), ("cpu_seconds", np.float64), ("energy", np.float64)]
+)
+
+# Keys whose checkpoint file a running calculation holds
+_claimed = set()
+_claimed_lock = threading.Lock()
+
+
+class Checkpoint:
+    """Per-conformer progress of one calculation, in a memory-mapped .npy.
+
+    Recording a conformer is a write into the mapped array; the OS pages it
+    out, and it is flushed to disk at most every FLUSH_INTERVAL_S. A
+    calculation that is stopped picks up from the conformers recorded here
+    the next time it runs, even in another process.
+
+    Only one calculation at a time holds a key's file. Another running the
+    same calculation meanwhile keeps its progress in memory instead.
+    """
+
+    def __init__(self, key, conformers, directory=CHECKPOINT_DIR):
+        self.key = key
+        self.path = os.path.join(directory, f"{key}.npy")
+        self.state = None
+        with _claimed_lock:
+            if key in _claimed:
+                self.path = None
+            else:
+                _claimed.add(key)
+        if self.path is None:
+            self.state = np.zeros(conformers, dtype=CHECKPOINT_DTYPE)
+            self.state["energy"] = np.nan
+        elif os.path.exists(self.path):
+            state = np.load(self.path, mmap_mode="r+")
+            if state.dtype == CHECKPOINT_DTYPE and state.shape == (conformers,):
+                self.state = state
+        if self.state is None:
+            os.makedirs(directory, exist_ok=True)
+            self.state = np.lib.format.open_memmap(
+                self.path, mode="w+", dtype=CHECKPOINT_DTYPE, shape=(conformers,)
+            )
+            self.state["energy"] = np.nan
+        self._flushed = time.monotonic()
+
+    def pending(self):
+        """Indices of the conformers still to compute."""
+        return np.flatnonzero(~self.state["done"]).tolist()
+
+    @property
+    def completed(self):
+        return int(np.count_nonzero(self.state["done"]))
+
+    @property
+    def cpu_seconds(self):
+        """CPU time already spent on the recorded conformers."""
+        return float(self.state["cpu_seconds"][self.state["done"]].sum())
+
+    @property
+    def energies(self):
+        return self.state["energy"]
+
+    def record(self, index, cpu_seconds, energy=np.nan):
+        self.state[index] = (True, cpu_seconds, energy)
+        if time.monotonic() - self._flushed >= FLUSH_INTERVAL_S:
+            self.flush()
+
+    def flush(self):
+        if self.path is not None:
+            self.state.flush()
+        self._flushed = time.monotonic()
+
+    def close(self):
+        """Flush and let the next run of the calculation take the file."""
+        self.flush()
+        self._release()
+
+    def remove(self):
+        """Delete the checkpoint once the calculation's result is stored."""
+        self.state = None  # Unmap before deleting, which Windows requires
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+        self._release()
+
+    def _release(self):
+        if self.path is not None:
+            with _claimed_lock:
+                _claimed.discard(self.key)
+            self.path = None
+
+
+def benchmark(conformers, preempt_at):
+    import tempfile
+
+    directory = tempfile.mkdtemp()
+    rng = np.random.default_rng(0)
+    cpu_seconds = rng.uniform(0.05, 0.15, conformers)
+
+    checkpoint = Checkpoint("benchmark", conformers, directory)
+    started = time.perf_counter()
+    for index in range(preempt_at):
+        checkpoint.record(index, cpu_seconds[index])
+    checkpoint.close()
+    recorded = time.perf_counter() - started
+    print(f"Recorded {preempt_at} conformers in {recorded * 1e3:.2f} ms "
+          f"({recorded / preempt_at * 1e6:.1f} us each)")
+
+    # A later run, as after the next idle window starts
+    resumed = Checkpoint("benchmark", conformers, directory)
+    print(f"Resumed at conformer {resumed.completed}/{conformers}: "
+          f"{resumed.cpu_seconds:.1f} CPU-s kept, "
+          f"{len(resumed.pending())} conformers to go")
+    resumed.remove()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exercise calculation checkpoints.")
+    parser.add_argument("--conformers", type=int, default=100000)
+    parser.add_argument("--preempt-at", type=int, default=60000)
+    args = parser.parse_args()
+    benchmark(args.conformers, args.preempt_at)
@@ -0,0 +1,73 @@
+# scripts/clock.py
+
+import datetime
+import threading
+import time
+from contextlib import contextmanager
+
+
+class WallClock:
+    """The real time; what the app runs on."""
+
+    def now(self):
+        return datetime.datetime.now()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """Time that only moves when it is advanced.
+
+    Replays jump it from one scheduled event to the next, so a week or a
+    year of schedule takes as long as the events themselves.
+    """
+
+    def __init__(self, start):
+        self._now = start
+        self._lock = threading.Lock()
+
+    def now(self):
+        with self._lock:
+            return self._now
+
+    def advance_to(self, moment):
+        with self._lock:
+            if moment < self._now:
+                raise ValueError(f"Cannot go back from {self._now} to {moment}")
+            self._now = moment
+
+    def sleep(self, seconds):
+        with self._lock:
+            self._now += datetime.timedelta(seconds=seconds)
+
+
+_clock = WallClock()
+
+
+def now():
+    """The current time on whichever clock is in use."""
+    return _clock.now()
+
+
+def sleep(seconds):
+    _clock.sleep(seconds)
+
+
+def get_clock():
+    return _clock
+
+
+def set_clock(clock):
+    global _clock
+    _clock = clock
+
+
+@contextmanager
+def use_clock(clock):
+    previous = get_clock()
+    set_clock(clock)
+    try:
+        yield clock
+    finally:
+        set_clock(previous)
@@ -1,76 +1,257 @@
-import pandas as pd
-import numpy as np
+# scripts/data.py
+
+import argparse
 import datetime
-import random
+import os
+import time
+
+import numpy as np
+import pandas as pd
 
 # Parameters
 start_date = datetime.datetime(2023, 7, 1)
 end_date = datetime.datetime(2023, 9, 30)
-time_interval = datetime.timedelta(minutes=15)  # Data every 15 minutes
-
-# Generate date range
-date_range = pd.date_range(start=start_date, end=end_date, freq="15T")
-
-# Initialize list to store data
-data = []
-
-for timestamp in date_range:
-    day_of_week = timestamp.weekday()  # Monday=0, Sunday=6
-    hour = timestamp.hour
-    minute = timestamp.minute
-
-    # Initialize CPU usage
-    cpu_usage = 0
-
-    # Weekday patterns
-    if day_of_week < 5:
-        if 9 <= hour < 17:
-            # Work hours
-            cpu_usage = np.random.normal(70, 10)  # Mean 70%, SD 10%
-        elif 17 <= hour < 22:
-            # Evening leisure hours
-            cpu_usage = np.random.normal(40, 10)  # Mean 40%, SD 10%
-        elif 8 <= hour < 9 or 22 <= hour < 23:
-            # Morning prep and late evening
-            cpu_usage = np.random.normal(20, 5)  # Mean 20%, SD 5%
-        else:
-            # Night time
-            cpu_usage = np.random.normal(5, 2)  # Mean 5%, SD 2%
-    else:
-        # Weekend patterns
-        if 10 <= hour < 24:
-            # Daytime and evening
-            cpu_usage = np.random.normal(30, 15)  # Mean 30%, SD 15%
-        else:
-            # Early morning
-            cpu_usage = np.random.normal(10, 5)  # Mean 10%, SD 5%
+time_interval = "15min"  # Data every 15 minutes
+
+# Usage bands as (mean, sd). The index of each band is what
+# usage_band_index() returns for a timestamp.
+USAGE_BANDS = [
+    (70, 10),  # Weekday work hours
+    (40, 10),  # Weekday evening leisure hours
+    (20, 5),  # Weekday morning prep and late evening
+    (5, 2),  # Weekday night time
+    (30, 15),  # Weekend daytime and evening
+    (10, 5),  # Weekend early morning
+]
+
+# Activity status thresholds (upper bounds, exclusive) and labels
+ACTIVITY_THRESHOLDS = np.array([10, 50, 75])
+ACTIVITY_LABELS = ["Idle", "Light Usage", "High Usage", "Very High Usage"]
+
+
+def usage_band_index(timestamps):
+    """Map every timestamp to its row in USAGE_BANDS in one vectorized pass."""
+    timestamps = pd.DatetimeIndex(timestamps)
+    day_of_week = timestamps.dayofweek.to_numpy()  # Monday=0, Sunday=6
+    hour = timestamps.hour.to_numpy()
+    weekday = day_of_week < 5
+
+    conditions = [
+        weekday & (hour >= 9) & (hour < 17),
+        weekday & (hour >= 17) & (hour < 22),
+        weekday & (((hour >= 8) & (hour < 9)) | ((hour >= 22) & (hour < 23))),
+        weekday,
+        ~weekday & (hour >= 10),
+    ]
+    return np.select(conditions, [0, 1, 2, 3, 4], default=5).astype(np.int8)
+
+
+def activity_status(cpu_usage):
+    codes = np.searchsorted(ACTIVITY_THRESHOLDS, cpu_usage, side="right")
+    return pd.Categorical.from_codes(codes, categories=ACTIVITY_LABELS)
+
+
+def host_name(host):
+    return f"host-{host:03d}"
+
+
+def generate_usage(timestamps, hosts=1, rng=None, first_host=0, total_hosts=None):
+    """Generate CPU usage for every (host, timestamp) pair.
+
+    The band masks are computed once over ``timestamps`` and every band is
+    sampled with a single batched ``rng.normal`` call for all hosts.
+    ``first_host``/``total_hosts`` let a chunk cover a slice of a larger
+    fleet while keeping the same Host categories as every other chunk.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    if total_hosts is None:
+        total_hosts = first_host + hosts
+    timestamps = pd.DatetimeIndex(timestamps)
+
+    bands = np.tile(usage_band_index(timestamps), hosts)
+    cpu_usage = np.empty(len(bands), dtype=np.float64)
+    for band, (mean, sd) in enumerate(USAGE_BANDS):
+        mask = bands == band
+        cpu_usage[mask] = rng.normal(mean, sd, size=np.count_nonzero(mask))
 
     # Clamp CPU usage between 0% and 100%
-    cpu_usage = max(0, min(100, cpu_usage))
-
-    # Determine activity status
-    if cpu_usage < 10:
-        activity_status = "Idle"
-    elif cpu_usage < 50:
-        activity_status = "Light Usage"
-    elif cpu_usage < 75:
-        activity_status = "High Usage"
-    else:
-        activity_status = "Very High Usage"
-
-    # Append data point
-    data.append(
-        {
-            "Timestamp": timestamp,
-            "CPU_Usage": cpu_usage,
-            "Activity_Status": activity_status,
-        }
+    np.clip(cpu_usage, 0, 100, out=cpu_usage)
+
+    columns = {"Timestamp": np.tile(timestamps.values, hosts)}
+    if total_hosts > 1:
+        columns["Host"] = pd.Categorical.from_codes(
+            np.repeat(np.arange(first_host, first_host + hosts), len(timestamps)),
+            categories=[host_name(i) for i in range(total_hosts)],
+        )
+    columns["CPU_Usage"] = cpu_usage
+    columns["Activity_Status"] = activity_status(cpu_usage)
+    return pd.DataFrame(columns)
+
+
+def _open_partition_writer(path, schema, file_format):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if file_format == "parquet":
+        return pq.ParquetWriter(path, schema)
+    return pa.ipc.new_file(path, schema)
+
+
+def _write_chunk(writers, directory, df, file_format):
+    """Append ``df`` to the partition file in ``directory``, opening it once."""
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    writer = writers.get(directory)
+    if writer is None:
+        # Partitions are produced in order, so earlier ones are finished
+        for finished in writers.values():
+            finished.close()
+        writers.clear()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"part-0.{file_format}")
+        writer = writers[directory] = _open_partition_writer(
+            path, table.schema, file_format
+        )
+    writer.write_table(table)
+
+
+def stream_usage(
+    output_dir,
+    start,
+    end,
+    freq=time_interval,
+    hosts=1,
+    rng=None,
+    partition_by="day",
+    file_format="parquet",
+    chunk_rows=1_000_000,
+):
+    """Generate and write usage data in chunks of at most ``chunk_rows`` rows.
+
+    Output is a hive-partitioned directory (``day=YYYY-MM-DD/`` or
+    ``host=host-000/``) with one Parquet or Feather file per partition, so
+    memory use depends on ``chunk_rows`` rather than on the length of the
+    span or the size of the fleet.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    start = pd.Timestamp(start)
+    step = pd.to_timedelta(pd.tseries.frequencies.to_offset(freq))
+    periods = (pd.Timestamp(end) - start) // step + 1
+
+    def timestamps(first, last):
+        return start + pd.to_timedelta(np.arange(first, last) * step.value, unit="ns")
+
+    writers = {}
+    rows = 0
+    try:
+        if partition_by == "host":
+            for host in range(hosts):
+                directory = os.path.join(output_dir, f"host={host_name(host)}")
+                for first in range(0, periods, chunk_rows):
+                    block = timestamps(first, min(first + chunk_rows, periods))
+                    df = generate_usage(block, rng=rng, first_host=host, total_hosts=1)
+                    _write_chunk(writers, directory, df, file_format)
+                    rows += len(df)
+        else:
+            time_rows = max(1, chunk_rows // hosts)
+            host_rows = max(1, chunk_rows // time_rows)
+            for first in range(0, periods, time_rows):
+                block = timestamps(first, min(first + time_rows, periods))
+                days = block.normalize()
+                # Split the block where the day changes
+                edges = np.flatnonzero(days[1:] != days[:-1]) + 1
+                for day_block in np.split(np.arange(len(block)), edges):
+                    day = days[day_block[0]].strftime("%Y-%m-%d")
+                    directory = os.path.join(output_dir, f"day={day}")
+                    for first_host in range(0, hosts, host_rows):
+                        df = generate_usage(
+                            block[day_block],
+                            hosts=min(host_rows, hosts - first_host),
+                            rng=rng,
+                            first_host=first_host,
+                            total_hosts=hosts,
+                        )
+                        _write_chunk(writers, directory, df, file_format)
+                        rows += len(df)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return rows
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate mock CPU usage data.")
+    parser.add_argument("--start", default=start_date.isoformat())
+    parser.add_argument("--end", default=end_date.isoformat())
+    parser.add_argument("--freq", default=time_interval)
+    parser.add_argument("--hosts", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument(
+        "--output",
+        default=None,
+        help="CSV file, or dataset directory when --partition-by is given",
     )
+    parser.add_argument(
+        "--partition-by",
+        choices=["day", "host"],
+        default=None,
+        help="Stream chunks into a partitioned columnar dataset",
+    )
+    parser.add_argument("--format", choices=["parquet", "feather"], default="parquet")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+    if args.output is None:
+        args.output = (
+            "mock_cpu_usage_data" if args.partition_by else "mock_cpu_usage_data.csv"
+        )
+    if args.partition_by and os.path.isdir(args.output) and os.listdir(args.output):
+        parser.error(f"output directory '{args.output}' is not empty")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = np.random.default_rng(args.seed)
+
+    if args.partition_by:
+        started = time.perf_counter()
+        rows = stream_usage(
+            args.output,
+            args.start,
+            args.end,
+            freq=args.freq,
+            hosts=args.hosts,
+            rng=rng,
+            partition_by=args.partition_by,
+            file_format=args.format,
+            chunk_rows=args.chunk_rows,
+        )
+        elapsed = time.perf_counter() - started
+        print(
+            f"Streamed {rows:,} rows for {args.hosts} host(s) in {elapsed:.3f}s "
+            f"({rows / max(elapsed, 1e-9):,.0f} rows/s) to '{args.output}/'."
+        )
+        return
+
+    # Generate date range
+    date_range = pd.date_range(start=args.start, end=args.end, freq=args.freq)
+
+    started = time.perf_counter()
+    df = generate_usage(date_range, hosts=args.hosts, rng=rng)
+    elapsed = time.perf_counter() - started
+    print(
+        f"Generated {len(df):,} rows for {args.hosts} host(s) in {elapsed:.3f}s "
+        f"({len(df) / max(elapsed, 1e-9):,.0f} rows/s)."
+    )
+
+    # Save to CSV
+    df.to_csv(args.output, index=False)
 
-# Create DataFrame
-df = pd.DataFrame(data)
+    print(f"Mock data generated and saved to '{args.output}'.")
 
-# Save to CSV
-df.to_csv("mock_cpu_usage_data.csv", index=False)
 
-print("Mock data generated and saved to 'mock_cpu_usage_data.csv'.")
+if __name__ == "__main__":
+    main()
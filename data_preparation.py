@@ -2,97 +2,300 @@
 
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
-from xgboost import XGBClassifier
-import joblib
 import os
-import psutil
-import time
-from threading import Thread
-
-
-def prepare_data():
-    # Load the dataset
-    df = pd.read_csv("mock_cpu_usage_data.csv")
-
-    # Convert 'Timestamp' to datetime
-    df["Timestamp"] = pd.to_datetime(df["Timestamp"])
-
-    # Extract time-based features
-    df["Hour"] = df["Timestamp"].dt.hour
-    df["Minute"] = df["Timestamp"].dt.minute
-    df["DayOfWeek"] = df["Timestamp"].dt.dayofweek  # Monday=0, Sunday=6
-    df["IsWeekend"] = df["DayOfWeek"].apply(lambda x: 1 if x >= 5 else 0)
-    df["TimeOfDay"] = df["Hour"] * 60 + df["Minute"]
-
-    # Sort by Timestamp
-    df = df.sort_values("Timestamp").reset_index(drop=True)
-
-    # **Redefine 'Activity_Status' based on new CPU usage ranges**
-    def map_usage_level(cpu_usage):
-        if cpu_usage < 10:
-            return "Idle"
-        elif 10 <= cpu_usage < 50:
-            return "Medium Usage"
-        elif 50 <= cpu_usage < 75:
-            return "High Usage"
-        else:
-            return "Very High Usage"
-
-    df["Activity_Status"] = df["CPU_Usage"].apply(map_usage_level)
 
-    # Map Activity_Status to numerical labels
-    activity_mapping = {
-        "Idle": 0,
-        "Medium Usage": 1,
-        "High Usage": 2,
-        "Very High Usage": 3,
-    }
-    df["Target"] = df["Activity_Status"].map(activity_mapping)
+from feature_store import load_cached_features
+from instrumentation import count, span, timed, write_report
+from features import FEATURE_COLS, FEATURES_VERSION, build_features
+from forecast_table import forecast_table, model_version
+from model_registry import (
+    build_manifest,
+    data_fingerprint,
+    is_current,
+    load_manifest,
+    load_model,
+    save_model,
+)
+from tree_export import TreeEnsemble, exported_version, export_trees
+
+# sklearn and xgboost are only imported by the functions that train, so
+# processes that just forecast from an exported model start quickly
+
+# XGBoost hyperparameters; changing any of them invalidates the saved model
+MODEL_PARAMS = {
+    "n_estimators": 100,
+    "learning_rate": 0.1,
+    "max_depth": 5,
+    "objective": "multi:softmax",  # Use softmax for multi-class classification
+    "num_class": 4,  # Number of classes updated to 4
+    "random_state": 42,
+    "eval_metric": "mlogloss",
+}
+
+# Boosting rounds added per incremental update, and how many updates a model
+# may accumulate before it is rebuilt from scratch on the training window
+INCREMENTAL_ROUNDS = 10
+MAX_INCREMENTAL_UPDATES = 20
+
+
+def load_usage_data(source="mock_cpu_usage_data.csv", days=None, hosts=None):
+    """Load usage data from a CSV file or a partitioned dataset directory.
+
+    Directories written by ``data.py --partition-by`` are read through
+    pyarrow.dataset, so only the ``days``/``hosts`` partitions asked for are
+    opened.
+    """
+    if not os.path.isdir(source):
+        return pd.read_csv(source)
+
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    if days is not None:
+        days = [pd.Timestamp(day).strftime("%Y-%m-%d") for day in days]
+
+    # Partitions are named "day=YYYY-MM-DD" or "host=host-000"
+    partitions = sorted(os.listdir(source))
+    partition_key = partitions[0].split("=")[0] if partitions else "day"
+    file_format = "parquet"
+    for _, _, files in os.walk(source):
+        if files:
+            file_format = "ipc" if files[0].endswith(".feather") else "parquet"
+            break
+
+    dataset = ds.dataset(
+        source,
+        format=file_format,
+        partitioning=ds.partitioning(
+            pa.schema([(partition_key, pa.string())]), flavor="hive"
+        ),
+    )
+    wanted = days if partition_key == "day" else hosts
+    expression = None
+    if wanted is not None:
+        expression = ds.field(partition_key).isin(list(wanted))
+    df = dataset.to_table(filter=expression).to_pandas()
+
+    # Apply the filter that the partitioning could not
+    if partition_key == "day":
+        df = df.drop(columns="day")
+        if hosts is not None and "Host" in df:
+            df = df[df["Host"].isin(hosts)]
+    else:
+        df = df.rename(columns={"host": "Host"})
+        if days is not None:
+            df = df[df["Timestamp"].dt.strftime("%Y-%m-%d").isin(days)]
+    return df.reset_index(drop=True)
+
+
+@timed()
+def prepare_data(
+    source="mock_cpu_usage_data.csv", days=None, hosts=None, use_cache=True
+):
+    # Load the dataset, reusing cached features when only a CSV is asked for
+    if use_cache and days is None and hosts is None and not os.path.isdir(source):
+        df = load_cached_features(source, build_features, version=FEATURES_VERSION)
+    else:
+        df = build_features(load_usage_data(source, days=days, hosts=hosts))
+
+    count("rows_prepared", len(df))
 
     # Print class distribution
-    class_counts = df["Target"].value_counts()
-    print("Class distribution:")
-    print(class_counts)
+    class_counts = df["Target"].value_counts().sort_index()
+    print(f"Class distribution: {class_counts.to_dict()}")
 
     return df
 
 
-def train_model(df):
-    # Define feature columns
-    feature_cols = ["Hour", "DayOfWeek", "IsWeekend", "TimeOfDay"]
+def training_window(df, window=None):
+    """Keep only the rows within ``window`` (e.g. "30D") of the newest one."""
+    if window is None:
+        return df
+    cutoff = df["Timestamp"].iloc[-1] - pd.Timedelta(window)
+    return df[df["Timestamp"] > cutoff].reset_index(drop=True)
 
-    X = df[feature_cols]
-    y = df["Target"]
 
-    # Split the data
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, shuffle=False  # Do not shuffle for time series data
+def model_manifest(df, window=None):
+    manifest = build_manifest(df, FEATURE_COLS, MODEL_PARAMS, FEATURES_VERSION)
+    manifest["window"] = None if window is None else str(pd.Timedelta(window))
+    return manifest
+
+
+def record_trained_rows(manifest, history, through):
+    """Note in ``manifest`` that the model has seen ``history`` up to ``through``.
+
+    The fingerprint of those rows lets ``update_model`` tell new rows
+    appended to the data from data that was rewritten.
+    """
+    trained = history[history["Timestamp"] <= through]
+    manifest["trained_through"] = str(through)
+    manifest["trained_rows"] = len(trained)
+    manifest["trained_fingerprint"] = data_fingerprint(
+        trained, FEATURE_COLS + ["Target"]
     )
+    return manifest
+
+
+def trained_rows_unchanged(history, saved):
+    """Whether ``history`` still starts with the rows the saved model saw."""
+    if "trained_fingerprint" not in saved:
+        return False
+    trained = history[history["Timestamp"] <= pd.Timestamp(saved["trained_through"])]
+    return len(trained) == saved["trained_rows"] and data_fingerprint(
+        trained, FEATURE_COLS + ["Target"]
+    ) == saved["trained_fingerprint"]
+
+
+def booster_params():
+    """MODEL_PARAMS as xgb.train takes them, rather than XGBClassifier."""
+    params = {
+        k: v
+        for k, v in MODEL_PARAMS.items()
+        if k not in ("n_estimators", "random_state")
+    }
+    params["seed"] = MODEL_PARAMS["random_state"]
+    return params
+
+
+def load_or_train_model(df, window=None, incremental=True):
+    """Reuse the registered model when it was trained on this data and config.
+
+    When only new rows arrived since it was saved, the model is updated
+    with them instead of being retrained on the whole history.
+    """
+    model = load_model(model_manifest(training_window(df, window), window))
+    if model is not None and not trees_exported(load_manifest()):
+        export_trees(model, version=model_version(model))
+    if model is None:
+        if incremental:
+            model = update_model(df, window)
+        else:
+            model = train_model(df, window)
+    return model
+
+
+def load_inference_model(df, window=None):
+    """Model for forecasting only.
+
+    When the registered model is current, its NumPy tree export is returned
+    and xgboost is never imported; otherwise this is load_or_train_model.
+    """
+    manifest = model_manifest(training_window(df, window), window)
+    if is_current(manifest) and trees_exported(load_manifest()):
+        print("Loaded exported trees of the registered model.")
+        return TreeEnsemble.load()
+    return load_or_train_model(df, window)
+
+
+def trees_exported(saved):
+    """Whether the tree export on disk is of the model ``saved`` describes."""
+    version = exported_version()
+    return version is not None and version == (saved or {}).get("model_version")
 
+
+def register_model(model, manifest):
+    """Save the model and its NumPy tree export for inference-only processes.
+
+    The trees are exported first and the manifest, written last, names the
+    version they must have, so a crash in between never pairs a manifest
+    with trees of another model.
+    """
+    version = model_version(model)
+    export_trees(model, version=version)
+    save_model(model, dict(manifest, model_version=version))
+
+
+def class_sample_weights(y):
     # **Compute class weights**
     from sklearn.utils import class_weight
 
+    classes = np.unique(y)
     class_weights_array = class_weight.compute_class_weight(
-        class_weight="balanced", classes=np.unique(y_train), y=y_train
+        class_weight="balanced", classes=classes, y=y
     )
-    class_weights_dict = dict(zip(np.unique(y_train), class_weights_array))
+    class_weights_dict = dict(zip(classes, class_weights_array))
 
     # **Create sample weights**
-    sample_weights = y_train.apply(lambda x: class_weights_dict[x])
+    return y.map(class_weights_dict).to_numpy()
+
+
+@timed()
+def update_model(history, window=None):
+    """Continue boosting the registered model on rows it has not seen yet.
+
+    Boosting cost is proportional to the number of new rows. Falls back to
+    a full retrain on the window when there is no compatible model to
+    continue from, when the rows it was trained on have changed rather
+    than been appended to, or when it has already been updated
+    MAX_INCREMENTAL_UPDATES times.
+    """
+    import xgboost as xgb
+    from xgboost import XGBClassifier
+
+    df = training_window(history, window)
+    manifest = model_manifest(df, window)
+    model = load_model(manifest, ignore={"data_fingerprint", "rows"})
+    saved = load_manifest()
+    if model is None or saved.get("incremental_updates", 0) >= MAX_INCREMENTAL_UPDATES:
+        return train_model(history, window)
+    if not trained_rows_unchanged(history, saved):
+        print("Rows the registered model was trained on have changed; retraining.")
+        return train_model(history, window)
+
+    new_rows = df[df["Timestamp"] > pd.Timestamp(saved["trained_through"])]
+    manifest["incremental_updates"] = saved.get("incremental_updates", 0)
+    record_trained_rows(manifest, history, pd.Timestamp(saved["trained_through"]))
+    if not new_rows.empty:
+        params = booster_params()
+        dtrain = xgb.DMatrix(
+            new_rows[FEATURE_COLS],
+            label=new_rows["Target"],
+            weight=class_sample_weights(new_rows["Target"]),
+        )
+        with span("xgboost_train"):
+            booster = xgb.train(
+                params,
+                dtrain,
+                num_boost_round=INCREMENTAL_ROUNDS,
+                xgb_model=model.get_booster(),
+            )
+        count("rows_trained", len(new_rows))
+        # Wrap the booster again; XGBClassifier.fit would reject a batch
+        # of new rows that is missing one of the classes
+        model = XGBClassifier()
+        model.load_model(bytearray(booster.save_raw("ubj")))
+        manifest["incremental_updates"] += 1
+        record_trained_rows(manifest, history, new_rows["Timestamp"].iloc[-1])
+        print(
+            f"Updated model with {len(new_rows)} new rows "
+            f"(+{INCREMENTAL_ROUNDS} rounds, {booster.num_boosted_rounds()} total)."
+        )
+
+    register_model(model, manifest)
+    return model
 
-    # Initialize and train the model
-    model = XGBClassifier(
-        n_estimators=100,
-        learning_rate=0.1,
-        max_depth=5,
-        objective="multi:softmax",  # Use softmax for multi-class classification
-        num_class=4,  # Number of classes updated to 4
-        random_state=42,
-        use_label_encoder=False,
-        eval_metric="mlogloss",
+
+@timed()
+def train_model(history, window=None):
+    from sklearn.model_selection import train_test_split
+    from xgboost import XGBClassifier
+
+    df = training_window(history, window)
+    X = df[FEATURE_COLS]
+    y = df["Target"]
+
+    # Split the data
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=0.2, shuffle=False  # Do not shuffle for time series data
     )
-    model.fit(X_train, y_train, sample_weight=sample_weights)
+
+    sample_weights = class_sample_weights(y_train)
+
+    # Initialize and train the model
+    model = XGBClassifier(use_label_encoder=False, **MODEL_PARAMS)
+    with span("xgboost_fit"):
+        model.fit(X_train, y_train, sample_weight=sample_weights)
+    count("rows_trained", len(X_train))
 
     # **Evaluate the model**
     from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
@@ -112,60 +315,41 @@ def train_model(df):
     print("Confusion Matrix:")
     print(cm)
 
-    # Save the model
-    os.makedirs("models", exist_ok=True)
-    joblib.dump(model, "models/idle_time_predictor.pkl")
-    print("Model saved to 'models/idle_time_predictor.pkl'.")
+    # Save the model next to a manifest describing what it was trained on;
+    # the held-out rows are left for the next update to boost on
+    manifest = model_manifest(df, window)
+    manifest["metrics"] = {"accuracy": float(accuracy)}
+    record_trained_rows(manifest, history, df["Timestamp"].iloc[len(X_train) - 1])
+    register_model(model, manifest)
 
     return model
 
 
-def predict_future_usage(model, df):
-    # **Simulate future time intervals (next 7 days)**
-    future_timestamps = pd.date_range(
+@timed()
+def predict_future_usage(model, df, periods=96 * 7):
+    # **Simulate future time intervals (next 7 days by default)**
+    # Predictions come from the model's compiled weekly slot table, so the
+    # horizon length does not add any model calls
+    table = forecast_table(model)
+    future_df = table.forecast(
         start=df["Timestamp"].iloc[-1] + pd.Timedelta(minutes=15),
-        periods=96 * 7,  # Next 7 days at 15-minute intervals
-        freq="15T",
+        periods=periods,  # 15-minute intervals
     )
 
-    # (existing code)
-
-    # Create a DataFrame for future predictions
-    future_df = pd.DataFrame({"Timestamp": future_timestamps})
+    count("rows_predicted", len(future_df))
 
-    # Extract features
-    future_df["Hour"] = future_df["Timestamp"].dt.hour
-    future_df["Minute"] = future_df["Timestamp"].dt.minute
-    future_df["DayOfWeek"] = future_df["Timestamp"].dt.dayofweek
-    future_df["IsWeekend"] = future_df["DayOfWeek"].apply(lambda x: 1 if x >= 5 else 0)
-    future_df["TimeOfDay"] = future_df["Hour"] * 60 + future_df["Minute"]
-
-    # Define feature columns
-    feature_cols = ["Hour", "DayOfWeek", "IsWeekend", "TimeOfDay"]
-
-    future_X = future_df[feature_cols]
-    future_predictions = model.predict(future_X)
-
-    # Add predictions to the DataFrame
-    future_df["Predicted_Status"] = future_predictions
-    activity_mapping_rev = {
-        0: "Idle",
-        1: "Medium Usage",
-        2: "High Usage",
-        3: "Very High Usage",
-    }
-    future_df["Predicted_Status_Label"] = future_df["Predicted_Status"].map(
-        activity_mapping_rev
+    # Print a summary of the predicted statuses
+    print(
+        f"Predicted {len(future_df)} slots from {future_df['Timestamp'].iloc[0]} "
+        f"to {future_df['Timestamp'].iloc[-1]}: "
+        f"{future_df['Predicted_Status_Label'].value_counts().to_dict()}"
     )
 
-    # Print predicted statuses
-    print("Predicted statuses for future timestamps:")
-    print(future_df[["Timestamp", "Predicted_Status_Label"]])
-
     return future_df
 
 
 if __name__ == "__main__":
     df = prepare_data()
-    model = train_model(df)
+    model = load_or_train_model(df)
     future_df = predict_future_usage(model, df)
+    write_report()
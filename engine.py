@@ -0,0 +1,220 @@
+# scripts/engine.py
+
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import psutil
+
+from schedule_windows import intensity_cores
+
+
+def _cpu_seconds(result):
+    # Tasks return their CPU-seconds, alone or first in a tuple
+    return result[0] if isinstance(result, tuple) else result
+
+
+class ComputationEngine:
+    """Runs CPU-bound tasks on a process pool sized by the forecast intensity.
+
+    The pool has one worker per core. ``set_intensity`` changes how many of
+    them may be busy at once: all for HIGH, half for MEDIUM, one for LOW
+    and none when stopped. Lowering it takes effect as running tasks
+    finish, so tasks should be short. Submitted functions return the
+    CPU-seconds they used (alone or first in a tuple with their result),
+    which ``throughput`` reports per intensity.
+    """
+
+    def __init__(self, cores=None):
+        self.cores = cores or os.cpu_count() or 1
+        self._pool = None
+        self._slots = threading.Condition()
+        self._limit = 0
+        self._busy = 0
+        self._intensity = None
+        self._suspended = False
+        self._since = time.perf_counter()
+        self.stats = {}
+
+    @property
+    def intensity(self):
+        return self._intensity
+
+    @property
+    def workers(self):
+        """Workers the current intensity allows to be busy."""
+        return self._limit
+
+    @property
+    def suspended(self):
+        return self._suspended
+
+    def worker_pids(self):
+        with self._slots:
+            if self._pool is None:
+                return []
+            # ProcessPoolExecutor has no public accessor for its workers
+            return list(self._pool._processes or {})
+
+    def _signal_workers(self, action):
+        for pid in self.worker_pids():
+            try:
+                getattr(psutil.Process(pid), action)()
+            except psutil.NoSuchProcess:
+                pass
+
+    def suspend(self):
+        """Freeze the workers mid-task and hold back new tasks."""
+        with self._slots:
+            self._suspended = True
+        self._signal_workers("suspend")
+
+    def resume(self):
+        with self._slots:
+            self._suspended = False
+            self._slots.notify_all()
+        self._signal_workers("resume")
+
+    def _stats(self, intensity):
+        return self.stats.setdefault(
+            intensity, {"tasks": 0, "cpu_s": 0.0, "wall_s": 0.0}
+        )
+
+    def set_intensity(self, intensity):
+        with self._slots:
+            now = time.perf_counter()
+            if self._intensity is not None:
+                self._stats(self._intensity)["wall_s"] += now - self._since
+            self._intensity = intensity
+            self._since = now
+            self._limit = intensity_cores(intensity, self.cores)
+            self._slots.notify_all()
+
+    def submit(self, fn, *args, timeout=None, cancel=None):
+        """Run ``fn(*args)`` on a worker once the intensity allows another.
+
+        Blocks while the workers are suspended or all the ones the intensity
+        allows are busy. Returns None if that lasts ``timeout`` seconds or
+        the ``cancel`` event is set meanwhile (see ``wake``).
+        """
+
+        def cancelled():
+            return cancel is not None and cancel.is_set()
+
+        with self._slots:
+            self._slots.wait_for(
+                lambda: cancelled()
+                or (not self._suspended and self._busy < self._limit),
+                timeout,
+            )
+            if cancelled() or self._suspended or self._busy >= self._limit:
+                return None
+            self._busy += 1
+            intensity = self._intensity
+            if self._pool is None:
+                # Workers are spawned, not forked: forking a process that
+                # runs Qt and scheduler threads can copy held locks
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.cores,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+            pool = self._pool
+        future = pool.submit(fn, *args)
+        future.add_done_callback(lambda f: self._finished(f, intensity))
+        return future
+
+    def _finished(self, future, intensity):
+        with self._slots:
+            self._busy -= 1
+            if not future.cancelled() and future.exception() is None:
+                stats = self._stats(intensity)
+                stats["tasks"] += 1
+                stats["cpu_s"] += _cpu_seconds(future.result())
+            self._slots.notify()
+
+    def wake(self):
+        """Make blocked ``submit`` calls recheck their cancel events."""
+        with self._slots:
+            self._slots.notify_all()
+
+    def wait_idle(self, timeout=None):
+        """Wait for every submitted task to finish."""
+        with self._slots:
+            return self._slots.wait_for(lambda: self._busy == 0, timeout)
+
+    def throughput(self):
+        """Tasks and CPU-seconds per wall-clock second, for each intensity."""
+        with self._slots:
+            wall = {intensity: s["wall_s"] for intensity, s in self.stats.items()}
+            if self._intensity is not None:
+                wall[self._intensity] = wall.get(self._intensity, 0.0) + (
+                    time.perf_counter() - self._since
+                )
+            return {
+                intensity: {
+                    "tasks": s["tasks"],
+                    "cpu_s": round(s["cpu_s"], 3),
+                    "wall_s": round(wall[intensity], 3),
+                    "tasks_per_s": round(s["tasks"] / wall[intensity], 2)
+                    if wall[intensity]
+                    else 0.0,
+                    "cpu_s_per_s": round(s["cpu_s"] / wall[intensity], 2)
+                    if wall[intensity]
+                    else 0.0,
+                }
+                for intensity, s in self.stats.items()
+            }
+
+    def shutdown(self, wait=True):
+        self.set_intensity(None)
+        self.resume()
+        with self._slots:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait, cancel_futures=True)
+
+
+def benchmark(seconds, cores):
+    from scoring import score_conformer
+
+    engine = ComputationEngine(cores)
+    # Start the workers up front so their spawn time is not measured
+    engine.set_intensity("HIGH")
+    for future in [
+        engine.submit(score_conformer, "Ethane (C2H6)", 0)
+        for _ in range(engine.workers)
+    ]:
+        future.result()
+    engine.set_intensity(None)
+    engine.stats.clear()
+
+    for intensity in ["HIGH", "MEDIUM", "LOW"]:
+        engine.set_intensity(intensity)
+        deadline = time.perf_counter() + seconds
+        index = 0
+        while time.perf_counter() < deadline:
+            engine.submit(score_conformer, "Ethanol (C2H5OH)", index, timeout=0.1)
+            index += 1
+        engine.wait_idle()
+    engine.shutdown()
+
+    print(f"Cores: {engine.cores}")
+    for intensity, stats in engine.throughput().items():
+        print(
+            f"{intensity:>6}: {intensity_cores(intensity, engine.cores):3d} workers "
+            f"{stats['tasks_per_s']:8.2f} tasks/s "
+            f"{stats['cpu_s_per_s']:6.2f} CPU-s/s"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure engine throughput at each intensity."
+    )
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--cores", type=int, default=None)
+    args = parser.parse_args()
+    benchmark(args.seconds, args.cores)
@@ -0,0 +1,147 @@
+# scripts/feature_store.py
+
+import hashlib
+import io
+import json
+import os
+
+import pandas as pd
+
+CACHE_DIR = os.path.join("cache", "features")
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def _cache_paths(source):
+    source = os.path.abspath(source)
+    key = hashlib.sha256(source.encode()).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(source))[0]
+    base = os.path.join(CACHE_DIR, f"{stem}-{key}")
+    return base + ".feather", base + ".json"
+
+
+def _hash_prefix(path, length):
+    """SHA-256 object fed with the first ``length`` bytes of ``path``."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        remaining = length
+        while remaining > 0:
+            block = f.read(min(HASH_BLOCK_SIZE, remaining))
+            if not block:
+                break
+            digest.update(block)
+            remaining -= len(block)
+    return digest
+
+
+def _complete_length(path, size):
+    """Length of ``path`` up to and including its last newline.
+
+    A writer may be in the middle of appending a row, so a trailing partial
+    line is left for the next refresh.
+    """
+    with open(path, "rb") as f:
+        position = size
+        while position > 0:
+            start = max(0, position - HASH_BLOCK_SIZE)
+            f.seek(start)
+            block = f.read(position - start)
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                return start + newline + 1
+            position = start
+    return 0
+
+
+def _load_manifest(manifest_path):
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _save(df, data_path, manifest_path, manifest):
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    # Write to temporary files first so a crash never leaves a torn cache
+    df.reset_index(drop=True).to_feather(data_path + ".tmp")
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(data_path + ".tmp", data_path)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+
+def load_cached_features(source, derive_features, version=0):
+    """Return ``derive_features(pd.read_csv(source))`` through an on-disk cache.
+
+    The cache is a Feather file keyed by the size, mtime and SHA-256 of the
+    source. An unchanged file is served straight from the cache, and a file
+    that only grew at the end has just its new rows parsed and derived.
+    ``version`` identifies ``derive_features``; a cache built by a different
+    version is rebuilt.
+    """
+    data_path, manifest_path = _cache_paths(source)
+    stat = os.stat(source)
+    manifest = _load_manifest(manifest_path)
+    if manifest is not None and (
+        manifest.get("version") != version or not os.path.exists(data_path)
+    ):
+        manifest = None
+
+    if (
+        manifest is not None
+        and manifest["size"] == stat.st_size
+        and manifest["mtime_ns"] == stat.st_mtime_ns
+    ):
+        print(f"Loaded cached features for '{source}'.")
+        return pd.read_feather(data_path)
+
+    length = _complete_length(source, stat.st_size)
+    tail = None
+    if manifest is not None and manifest["length"] <= length:
+        digest = _hash_prefix(source, manifest["length"])
+        if digest.hexdigest() == manifest["sha256"]:
+            with open(source, "rb") as f:
+                f.seek(manifest["length"])
+                tail = f.read(length - manifest["length"])
+            digest.update(tail)
+
+    if tail is None:
+        # New, rewritten or truncated source: rebuild from scratch
+        with open(source, "rb") as f:
+            content = f.read(length)
+        digest = hashlib.sha256(content)
+        df = derive_features(pd.read_csv(io.BytesIO(content)))
+        del content
+        print(f"Built feature cache for '{source}' ({len(df)} rows).")
+    else:
+        df = pd.read_feather(data_path)
+        if tail:
+            new_rows = pd.read_csv(
+                io.BytesIO(tail), header=None, names=manifest["columns"]
+            )
+            new_rows = derive_features(new_rows)
+            df = pd.concat([df, new_rows], ignore_index=True)
+            if not df["Timestamp"].is_monotonic_increasing:
+                df = df.sort_values("Timestamp", kind="stable").reset_index(drop=True)
+            print(f"Appended {len(new_rows)} new rows to feature cache for '{source}'.")
+        else:
+            print(f"Loaded cached features for '{source}'.")
+
+    with open(source, "rb") as f:
+        columns = list(pd.read_csv(f, nrows=0).columns)
+    _save(
+        df,
+        data_path,
+        manifest_path,
+        {
+            "source": os.path.abspath(source),
+            "version": version,
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "length": length,
+            "sha256": digest.hexdigest(),
+            "columns": columns,
+            "rows": len(df),
+        },
+    )
+    return df
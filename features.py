@@ -0,0 +1,143 @@
+# scripts/features.py
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+# Bump when the derived columns or their dtypes change, so cached
+# feature frames built by an older version are rebuilt
+FEATURES_VERSION = 2
+
+# Define feature columns
+FEATURE_COLS = ["Hour", "DayOfWeek", "IsWeekend", "TimeOfDay"]
+
+# Activity levels, in Target order, and the CPU usage bounds between them
+ACTIVITY_LABELS = ["Idle", "Medium Usage", "High Usage", "Very High Usage"]
+ACTIVITY_MAPPING = {label: code for code, label in enumerate(ACTIVITY_LABELS)}
+USAGE_THRESHOLDS = np.array([10, 50, 75])
+
+NS_PER_MINUTE = 60 * 1_000_000_000
+MINUTES_PER_DAY = 24 * 60
+EPOCH_WEEKDAY = 3  # 1970-01-01 was a Thursday
+
+
+def calendar_features(timestamps):
+    """Hour/Minute/DayOfWeek/IsWeekend/TimeOfDay for ``timestamps``.
+
+    Everything is derived with integer arithmetic on the nanosecond values,
+    which is several times faster than going through the ``.dt`` accessors.
+    """
+    timestamps = pd.DatetimeIndex(timestamps)
+    if timestamps.tz is not None:
+        timestamps = timestamps.tz_localize(None)
+    minutes = timestamps.asi8 // NS_PER_MINUTE
+    days, time_of_day = np.divmod(minutes, MINUTES_PER_DAY)
+    hour, minute = np.divmod(time_of_day, 60)
+    day_of_week = (days + EPOCH_WEEKDAY) % 7  # Monday=0, Sunday=6
+
+    return {
+        "Hour": hour.astype(np.int8),
+        "Minute": minute.astype(np.int8),
+        "DayOfWeek": day_of_week.astype(np.int8),
+        "IsWeekend": (day_of_week >= 5).astype(np.int8),
+        "TimeOfDay": time_of_day.astype(np.int16),
+    }
+
+
+def usage_levels(cpu_usage):
+    """Target code (0-3) for each CPU usage percentage."""
+    return np.searchsorted(USAGE_THRESHOLDS, cpu_usage, side="right").astype(np.int8)
+
+
+def activity_labels(codes):
+    return pd.Categorical.from_codes(codes, categories=ACTIVITY_LABELS)
+
+
+def add_calendar_features(df):
+    for name, values in calendar_features(df["Timestamp"]).items():
+        df[name] = values
+    return df
+
+
+def build_features(df):
+    """Derive the model inputs and labels for a raw usage frame."""
+    # Convert 'Timestamp' to datetime and sort by it
+    df["Timestamp"] = pd.to_datetime(df["Timestamp"])
+    if not df["Timestamp"].is_monotonic_increasing:
+        df = df.sort_values("Timestamp", kind="stable")
+    df = df.reset_index(drop=True)
+
+    add_calendar_features(df)
+
+    # Bucket CPU usage into activity levels
+    target = usage_levels(df["CPU_Usage"].to_numpy())
+    df["Activity_Status"] = activity_labels(target)
+    df["Target"] = target
+    return df
+
+
+def future_frame(timestamps):
+    """Feature frame for timestamps the model should predict."""
+    return pd.DataFrame({"Timestamp": timestamps, **calendar_features(timestamps)})
+
+
+def _build_features_rowwise(df):
+    # The original per-row implementation, kept for the benchmark
+    df["Timestamp"] = pd.to_datetime(df["Timestamp"])
+    df["Hour"] = df["Timestamp"].dt.hour
+    df["Minute"] = df["Timestamp"].dt.minute
+    df["DayOfWeek"] = df["Timestamp"].dt.dayofweek
+    df["IsWeekend"] = df["DayOfWeek"].apply(lambda x: 1 if x >= 5 else 0)
+    df["TimeOfDay"] = df["Hour"] * 60 + df["Minute"]
+    df = df.sort_values("Timestamp").reset_index(drop=True)
+
+    def map_usage_level(cpu_usage):
+        if cpu_usage < 10:
+            return "Idle"
+        elif 10 <= cpu_usage < 50:
+            return "Medium Usage"
+        elif 50 <= cpu_usage < 75:
+            return "High Usage"
+        else:
+            return "Very High Usage"
+
+    df["Activity_Status"] = df["CPU_Usage"].apply(map_usage_level)
+    df["Target"] = df["Activity_Status"].map(ACTIVITY_MAPPING)
+    return df
+
+
+def benchmark(rows):
+    rng = np.random.default_rng(0)
+    raw = pd.DataFrame(
+        {
+            "Timestamp": pd.date_range("2023-07-01", periods=rows, freq="min"),
+            "CPU_Usage": rng.uniform(0, 100, rows),
+        }
+    )
+
+    started = time.perf_counter()
+    rowwise = _build_features_rowwise(raw.copy())
+    rowwise_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    vectorized = build_features(raw.copy())
+    vectorized_seconds = time.perf_counter() - started
+
+    for column in FEATURE_COLS + ["Minute", "Target"]:
+        assert np.array_equal(rowwise[column], vectorized[column]), column
+
+    def feature_mb(df):
+        return df[FEATURE_COLS + ["Minute", "Target"]].memory_usage().sum() / 1e6
+
+    print(f"Rows: {rows:,}")
+    print(f"Row-wise:   {rowwise_seconds:8.2f}s  {feature_mb(rowwise):8.1f} MB")
+    print(f"Vectorized: {vectorized_seconds:8.2f}s  {feature_mb(vectorized):8.1f} MB")
+    print(f"Speedup:    {rowwise_seconds / vectorized_seconds:8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark feature engineering.")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    benchmark(parser.parse_args().rows)
@@ -0,0 +1,120 @@
+# scripts/forecast_table.py
+
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from features import (
+    ACTIVITY_LABELS,
+    EPOCH_WEEKDAY,
+    FEATURE_COLS,
+    calendar_features,
+    future_frame,
+)
+from tree_export import TreeEnsemble
+
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+SLOTS_PER_WEEK = 7 * SLOTS_PER_DAY  # 672
+TABLE_PATH = os.path.join("models", "idle_time_predictor.slots.npz")
+FORECAST_PATH = os.path.join("cache", "last_forecast.feather")
+
+# Any Monday works; the model only sees the slot's calendar features
+REFERENCE_MONDAY = pd.Timestamp("2024-01-01")
+
+NS_PER_SLOT = SLOT_MINUTES * 60 * 1_000_000_000
+
+
+def weekly_slots(timestamps):
+    """Slot of the week (0 = Monday 00:00) for each timestamp."""
+    timestamps = pd.DatetimeIndex(timestamps)
+    if timestamps.tz is not None:
+        timestamps = timestamps.tz_localize(None)
+    slots = timestamps.asi8 // NS_PER_SLOT + EPOCH_WEEKDAY * SLOTS_PER_DAY
+    return slots % SLOTS_PER_WEEK
+
+
+def weekly_slot(timestamp):
+    return int(weekly_slots([pd.Timestamp(timestamp)])[0])
+
+
+def model_version(model):
+    """Content hash of the model's trees, used to key compiled tables."""
+    if isinstance(model, TreeEnsemble):
+        # Exported ensembles carry the version of the model they came from
+        return model.version
+    raw = model.get_booster().save_raw("ubj")
+    return hashlib.sha256(raw).hexdigest()[:16]
+
+
+class ForecastTable:
+    """The model's prediction for every 15-minute slot of the week.
+
+    The model's features depend only on the slot, so any forecast horizon
+    and any "status now" query is an array lookup.
+    """
+
+    def __init__(self, statuses, version=None):
+        self.statuses = np.asarray(statuses, dtype=np.int8)
+        self.version = version
+
+    @classmethod
+    def compile(cls, model):
+        slot_starts = pd.date_range(
+            REFERENCE_MONDAY, periods=SLOTS_PER_WEEK, freq=f"{SLOT_MINUTES}min"
+        )
+        features = pd.DataFrame(calendar_features(slot_starts))[FEATURE_COLS]
+        return cls(model.predict(features), version=model_version(model))
+
+    @classmethod
+    def load(cls, path=TABLE_PATH):
+        with np.load(path) as saved:
+            return cls(saved["statuses"], version=str(saved["version"]))
+
+    def save(self, path=TABLE_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        np.savez(path, statuses=self.statuses, version=self.version)
+
+    def status_at(self, timestamp):
+        return int(self.statuses[weekly_slot(timestamp)])
+
+    def forecast(self, start, periods):
+        """Frame shaped like predict_future_usage's output, without the model."""
+        timestamps = pd.date_range(
+            start=start, periods=periods, freq=f"{SLOT_MINUTES}min"
+        )
+        future_df = future_frame(timestamps)
+        statuses = self.statuses[weekly_slots(timestamps)]
+        future_df["Predicted_Status"] = statuses
+        future_df["Predicted_Status_Label"] = np.asarray(
+            ACTIVITY_LABELS, dtype=object
+        )[statuses]
+        return future_df
+
+
+def forecast_table(model, path=TABLE_PATH):
+    """Compiled table for ``model``, reusing the saved one for the same model."""
+    version = model_version(model)
+    if os.path.exists(path):
+        table = ForecastTable.load(path)
+        if table.version == version:
+            return table
+    table = ForecastTable.compile(model)
+    table.save(path)
+    print(f"Compiled forecast table for model {version}.")
+    return table
+
+
+def save_forecast(future_df, path=FORECAST_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    future_df.to_feather(path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def load_forecast(path=FORECAST_PATH):
+    """The last saved forecast, or None when there is none yet."""
+    if not os.path.exists(path):
+        return None
+    return pd.read_feather(path)
@@ -28,11 +28,32 @@ from PyQt5.QtGui import QFont, QColor, QPalette, QIcon, QPixmap, QPainter, QBrus
 from PyQt5.QtWidgets import QGraphicsDropShadowEffect
 import pandas as pd
 
+from history_store import PERIODS
+
+
+PREVIOUS_CALCULATIONS_REFRESH_MS = 30000
+
+
+def _format_score(score):
+    return "" if score is None else str(round(score))
+
+
+def _format_date(date):
+    # 1/15/2024 11:25 AM
+    return f"{date.month}/{date.day}/{date.year} {date.strftime('%I:%M %p').lstrip('0')}"
+
+
+def _format_cpu_time(seconds):
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
 
 class SchedulerGUI(QWidget):
-    def __init__(self, future_df):
+    def __init__(self, future_df, forecast_table=None):
         super().__init__()
         self.future_df = future_df
+        self.forecast_table = forecast_table
         self.current_week_start = self.future_df["Timestamp"].min().date()
         self.current_time = QTime.currentTime()
         self.initUI()
@@ -196,6 +217,14 @@ class SchedulerGUI(QWidget):
         self.timer.timeout.connect(self.update_button_state)
         self.timer.start(1000)
 
+    def set_forecast(self, future_df, forecast_table=None):
+        """Show a newly computed forecast in place of the current one."""
+        self.future_df = future_df
+        self.forecast_table = forecast_table
+        self.current_week_start = self.future_df["Timestamp"].min().date()
+        self.setup_calendar()
+        self.show_schedule()
+
     def setup_calendar(self):
         min_date = self.future_df["Timestamp"].min().date()
         max_date = self.future_df["Timestamp"].max().date()
@@ -265,10 +294,17 @@ class SchedulerGUI(QWidget):
         )
 
         try:
-            row = self.future_df[self.future_df["Timestamp"] <= current_datetime].iloc[
-                -1
-            ]
-            predicted_status = row["Predicted_Status"]
+            if (
+                self.forecast_table is not None
+                and current_datetime >= self.future_df["Timestamp"].iloc[0]
+            ):
+                # Weekly slot lookup instead of scanning the forecast
+                predicted_status = self.forecast_table.status_at(current_datetime)
+            else:
+                row = self.future_df[
+                    self.future_df["Timestamp"] <= current_datetime
+                ].iloc[-1]
+                predicted_status = row["Predicted_Status"]
 
             if predicted_status == 0:
                 text = "Starting Automation with High Intensity"
@@ -331,56 +367,17 @@ class SchedulerGUI(QWidget):
 
 
 class ModernMolecularGUI(QMainWindow):
-    def __init__(self, future_df, computation_manager):
+    def __init__(self, future_df, computation_manager, forecast_table=None):
         super().__init__()
         self.future_df = future_df
         self.computation_manager = computation_manager
+        self.forecast_table = forecast_table
 
-        # Initialize data for leaderboards
-        self.weekly_data = [
-            [1, "Alice Smith", "alice@example.com", "Alice", 1500, 100],
-            [2, "Bob Johnson", "bob@example.com", "Bob", 1400, 90],
-            [3, "Charlie Brown", "charlie@example.com", "Charlie", 1300, 80],
-            [4, "David Wilson", "david@example.com", "David", 1200, 70],
-            [5, "Eva Green", "eva@example.com", "Eva", 1100, 60],
-        ]
-
-        self.all_time_data = [
-            [
-                1,
-                "Andre Neto Win",
-                "andre.neto.c.w@conceptpatech.com",
-                "Neto Win",
-                132383,
-                360,
-            ],
-            [2, "Dan Hannah", "dan.hannah@ses.ai", "dan.hannah", 126554, 199],
-            [3, "Roberta QATest", "robertaqatest@gmail.com", "qatest", 109424, 170],
-            [
-                4,
-                "Cristiano Moraes",
-                "cristianomoraescar@gmail.com",
-                "ccmoraes",
-                81421,
-                121,
-            ],
-            [5, "Daniel Walsh", "danwalshhh@gmail.com", "Dan", 50477, 91],
-            [6, "Leandro Barbosa", "leandro@fanhero.com", "leeaandrob", 36100, 60],
-            [7, "Raquel Comunale", "comunale.qa@gmail.com", "comunale.qa", 24005, 41],
-            [8, "Raul Burd", "raul@conceptpatech.com", "RB", 22928, 52],
-            [9, "Sarah Chen", "sarah.chen@example.com", "SarahC", 21500, 48],
-            [10, "Michael Rodriguez", "mrodriguez@example.com", "MikeR", 20100, 45],
-            [11, "Emma Thompson", "emma.t@example.com", "EmmaT", 19500, 43],
-            [12, "James Wilson", "jwilson@example.com", "JWil", 18900, 40],
-            [13, "Lisa Anderson", "lisa.a@example.com", "LisaA", 17800, 38],
-            [14, "Kevin Park", "kpark@example.com", "KPark", 16700, 35],
-            [15, "Maria Garcia", "mgarcia@example.com", "MariaG", 15600, 33],
-            [16, "Thomas Brown", "tbrown@example.com", "TomB", 14500, 30],
-            [17, "Anna Kim", "akim@example.com", "AnnaK", 13400, 28],
-            [18, "Peter Zhang", "pzhang@example.com", "PeterZ", 12300, 25],
-            [19, "Sophie Martin", "smartin@example.com", "SophieM", 11200, 23],
-            [20, "David Lee", "dlee@example.com", "DaveL", 10100, 20],
-        ]
+        # Leaderboards and previous calculations come from the history store
+        self.history_store = getattr(computation_manager, "history_store", None)
+        self.weekly_data = self.leaderboard_data("Weekly")
+        self.all_time_data = self.leaderboard_data("All time")
+        self.previous_table = None  # Set once the previous calculations card exists
 
         self.initUI()
 
@@ -436,25 +433,40 @@ class ModernMolecularGUI(QMainWindow):
         # Set default page
         self.stacked_widget.setCurrentWidget(self.home_page)
 
+    def update_forecast(self, future_df, forecast_table=None):
+        self.future_df = future_df
+        self.forecast_table = forecast_table
+        self.future_schedule_page.set_forecast(future_df, forecast_table)
+
+    def forecast_refresh_failed(self, message):
+        """Say the forecast shown is the saved one, as refreshing it failed."""
+        self.notification_banner.setText(
+            f"Forecast could not be refreshed; showing the saved one. ({message})"
+        )
+        self.notification_banner.setStyleSheet("""
+            QLabel {
+                background-color: #D9534F;
+                color: white;
+                font-size: 18px;
+                padding: 10px;
+                border-radius: 8px;
+            }
+        """)
+        self.notification_banner.show()
+        QTimer.singleShot(10000, self.notification_banner.hide)
+
+    def leaderboard_data(self, period):
+        if self.history_store is None:
+            return []
+        return self.history_store.leaderboard(PERIODS[period])
+
+    def refresh_leaderboards(self):
+        self.weekly_data = self.leaderboard_data("Weekly")
+        self.all_time_data = self.leaderboard_data(self.period_combo.currentText())
+        self.filter_tables(self.search_input.text())
+
     def update_period(self):
-        selected_period = self.period_combo.currentText()
-
-        # Implement logic to filter data based on the selected period
-        if selected_period == "Last 30 days":
-            # Filter or modify self.all_time_data as needed
-            self.populate_table(
-                self.rankings_table, self.all_time_data
-            )  # Replace with actual filtering logic
-        elif selected_period == "Last 60 days":
-            # Implement logic for Last 60 days
-            self.populate_table(
-                self.rankings_table, self.all_time_data
-            )  # Replace with actual filtering logic
-        elif selected_period == "All time":
-            # Show all-time data
-            self.populate_table(
-                self.rankings_table, self.all_time_data
-            )  # Replace with actual filtering logic
+        self.refresh_leaderboards()
 
     def create_sidebar(self):
         sidebar = QFrame()
@@ -1029,6 +1041,7 @@ class ModernMolecularGUI(QMainWindow):
         period_label.setStyleSheet("font-size: 14px; font-weight: normal; color: #666;")
         self.period_combo = QComboBox()
         self.period_combo.addItems(["Last 30 days", "Last 60 days", "All time"])
+        self.period_combo.currentTextChanged.connect(self.update_period)
 
         header_layout.addWidget(search_label)
         header_layout.addWidget(self.search_input)
@@ -1043,18 +1056,6 @@ class ModernMolecularGUI(QMainWindow):
         layout.addWidget(weekly_label)
 
         self.weekly_table = self.create_leaderboard_table()
-        self.weekly_data = [
-            [1, "Alice Smith", "alice@example.com", "Alice", 1500, 100],
-            [2, "Bob Johnson", "bob@example.com", "Bob", 1400, 90],
-            [3, "Charlie Brown", "charlie@example.com", "Charlie", 1300, 80],
-            [4, "David Wilson", "david@example.com", "David", 1200, 70],
-            [5, "Eva Green", "eva@example.com", "Eva", 1100, 60],
-            [6, "Frank Miller", "frank@example.com", "Frank", 1000, 55],
-            [7, "Grace Lee", "grace@example.com", "Grace", 950, 50],
-            [8, "Henry Ford", "henry@example.com", "Henry", 900, 45],
-            [9, "Iris West", "iris@example.com", "Iris", 850, 40],
-            [10, "Jack Ryan", "jack@example.com", "Jack", 800, 35],
-        ]
         self.populate_table(self.weekly_table, self.weekly_data)
         layout.addWidget(self.weekly_table)
 
@@ -1063,7 +1064,7 @@ class ModernMolecularGUI(QMainWindow):
         layout.addWidget(all_time_label)
 
         self.rankings_table = self.create_leaderboard_table()
-        # Keep your existing all_time_data
+        self.all_time_data = self.leaderboard_data(self.period_combo.currentText())
         self.populate_table(self.rankings_table, self.all_time_data)
         layout.addWidget(self.rankings_table)
 
@@ -1230,7 +1231,7 @@ class ModernMolecularGUI(QMainWindow):
 
     def create_future_schedule_page(self):
         # Integrate SchedulerGUI into the Future Schedule page
-        schedule_widget = SchedulerGUI(self.future_df)
+        schedule_widget = SchedulerGUI(self.future_df, self.forecast_table)
         return schedule_widget
 
     def create_workflow_card(self):
@@ -1490,15 +1491,39 @@ class ModernMolecularGUI(QMainWindow):
         table.setSelectionBehavior(QTableWidget.SelectRows)
         table.setSelectionMode(QTableWidget.SingleSelection)
 
-        # Add sample data
-        sample_data = [
-            ["Acetaldehyde (C2H4O)", "1027", "1/15/2024 11:25 AM", "00:02:17", "1.0.0"],
-            ["Acetaldehyde (C2H4O)", "842", "1/15/2024 11:22 AM", "00:02:12", "1.0.0"],
-            ["Acetaldehyde (C2H4O)", "797", "1/15/2024 11:15 AM", "00:01:22", "1.0.0"],
-        ]
+        self.previous_table = table
+        self.refresh_previous_calculations()
+
+        # Calculations finish while the app runs, so keep the table current
+        timer = QTimer(card)
+        timer.timeout.connect(self.refresh_previous_calculations)
+        timer.start(PREVIOUS_CALCULATIONS_REFRESH_MS)
+
+        layout.addWidget(table)
+        return card
+
+    def refresh_previous_calculations(self):
+        """Show the latest calculations in the history store."""
+        table = self.previous_table
+        if table is None:
+            return
+
+        # Latest calculations, from the history store
+        calculations = []
+        if self.history_store is not None:
+            calculations = [
+                [
+                    name,
+                    _format_score(score),
+                    _format_date(date),
+                    _format_cpu_time(cpu_time),
+                    settings,
+                ]
+                for name, score, date, cpu_time, settings in self.history_store.recent()
+            ]
 
-        table.setRowCount(len(sample_data))
-        for row, data in enumerate(sample_data):
+        table.setRowCount(len(calculations))
+        for row, data in enumerate(calculations):
             for col, value in enumerate(data):
                 item = QTableWidgetItem(value)
                 item.setTextAlignment(Qt.AlignLeft | Qt.AlignVCenter)
@@ -1519,16 +1544,15 @@ class ModernMolecularGUI(QMainWindow):
                 }
             """
             )
-            table.setCellWidget(row, len(headers) - 1, view_btn)
-
-        layout.addWidget(table)
-        return card
+            table.setCellWidget(row, table.columnCount() - 1, view_btn)
 
     def show_home(self):
+        self.refresh_previous_calculations()
         self.stacked_widget.setCurrentWidget(self.home_page)
         self.update_nav_buttons(active_button=self.home_btn)
 
     def show_rankings(self):
+        self.refresh_leaderboards()
         self.stacked_widget.setCurrentWidget(self.rankings_page)
         self.update_nav_buttons(active_button=self.rankings_btn)
 
@@ -0,0 +1,295 @@
+# scripts/history_store.py
+
+import argparse
+import datetime
+import getpass
+import os
+import sqlite3
+import threading
+import time
+
+from result_cache import SETTINGS_VERSION
+
+HISTORY_PATH = "history.sqlite3"
+BATCH_SIZE = 2048  # Calculations buffered before they are written together
+FLUSH_INTERVAL_S = 5.0
+CACHE_KB = 64 * 1024  # Keeps the indexes' hot pages in memory as they grow
+LEADERBOARD_SIZE = 20
+DAY_S = 86400
+
+# Leaderboard periods in days, as offered in the GUI; None is all time
+PERIODS = {
+    "Weekly": 7,
+    "Last 30 days": 30,
+    "Last 60 days": 60,
+    "All time": None,
+}
+
+# Each calculation also adds to its user's total for the day, so a
+# leaderboard adds up a few rows per user and day, however many
+# calculations there are. Days count from 1970-01-01 in local time, the
+# days the GUI's dates are in.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY,
+    full_name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    nickname TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS calculations (
+    id INTEGER PRIMARY KEY,
+    user_id INTEGER NOT NULL REFERENCES users (id),
+    molecule TEXT NOT NULL,
+    score REAL,
+    date REAL NOT NULL,
+    cpu_time REAL NOT NULL,
+    settings TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_calculations_user_date
+    ON calculations (user_id, date);
+CREATE INDEX IF NOT EXISTS ix_calculations_score
+    ON calculations (molecule, score);
+CREATE TABLE IF NOT EXISTS daily_totals (
+    day INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    score REAL NOT NULL,
+    molecules INTEGER NOT NULL,
+    PRIMARY KEY (day, user_id)
+) WITHOUT ROWID;
+CREATE TRIGGER IF NOT EXISTS tr_calculations_daily_totals
+AFTER INSERT ON calculations
+BEGIN
+    INSERT INTO daily_totals (day, user_id, score, molecules)
+    VALUES (
+        CAST(julianday(NEW.date, 'unixepoch', 'localtime') - 2440587.5 AS INTEGER),
+        NEW.user_id, COALESCE(NEW.score, 0), 1
+    )
+    ON CONFLICT (day, user_id) DO UPDATE SET
+        score = score + excluded.score,
+        molecules = molecules + 1;
+END;
+"""
+
+LEADERBOARD_QUERY = """
+SELECT users.full_name, users.email, users.nickname, totals.score, totals.molecules
+FROM (
+    SELECT user_id, SUM(score) AS score, SUM(molecules) AS molecules
+    FROM daily_totals
+    WHERE day >= ?
+    GROUP BY user_id
+) AS totals
+JOIN users ON users.id = totals.user_id
+ORDER BY totals.score DESC, totals.molecules DESC, users.nickname
+LIMIT ?
+"""
+
+
+def local_user():
+    """(full name, email, nickname) of whoever runs the app."""
+    name = getpass.getuser()
+    return name, "", name
+
+
+EPOCH_DAY = datetime.date(1970, 1, 1).toordinal()
+
+
+def local_day(timestamp):
+    """The day ``timestamp`` falls on in local time, as daily_totals counts."""
+    return datetime.date.fromtimestamp(timestamp).toordinal() - EPOCH_DAY
+
+
+def _timestamp(date):
+    if isinstance(date, (int, float)):
+        return float(date)
+    return date.timestamp()
+
+
+class HistoryStore:
+    """Every calculation's result, kept in SQLite for the leaderboards.
+
+    ``add`` buffers calculations and writes them ``BATCH_SIZE`` at a time
+    in one transaction, and a background thread writes out whatever is
+    buffered every ``FLUSH_INTERVAL_S``, so a crash loses at most that
+    much. Reads write the buffer out first, so they always see every
+    calculation. Leaderboard days are local days.
+    """
+
+    def __init__(self, path=HISTORY_PATH, user=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = []
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(f"PRAGMA cache_size=-{CACHE_KB}")
+        self._connection.executescript(SCHEMA)
+        self.user_id = self.add_user(*(user or local_user()))
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_periodically, name="HistoryFlush", daemon=True
+        )
+        self._flusher.start()
+
+    def add_user(self, full_name, email, nickname):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR IGNORE INTO users (full_name, email, nickname) "
+                "VALUES (?, ?, ?)",
+                (full_name, email, nickname),
+            )
+            return self._connection.execute(
+                "SELECT id FROM users WHERE nickname = ?", (nickname,)
+            ).fetchone()[0]
+
+    def add(self, molecule, score, date, cpu_time, settings=SETTINGS_VERSION,
+            user_id=None):
+        row = (
+            self.user_id if user_id is None else user_id,
+            molecule,
+            score,
+            _timestamp(date),
+            cpu_time or 0.0,
+            settings,
+        )
+        with self._lock:
+            self._pending.append(row)
+            if len(self._pending) >= BATCH_SIZE:
+                self._write()
+
+    def flush(self):
+        with self._lock:
+            self._write()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(FLUSH_INTERVAL_S):
+            self.flush()
+
+    def _write(self):
+        if self._pending:
+            with self._connection:
+                self._connection.executemany(
+                    "INSERT INTO calculations "
+                    "(user_id, molecule, score, date, cpu_time, settings) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    self._pending,
+                )
+            self._pending = []
+
+    def _query(self, sql, parameters=()):
+        with self._lock:
+            self._write()
+            return self._connection.execute(sql, parameters).fetchall()
+
+    def leaderboard(self, days=None, limit=LEADERBOARD_SIZE, now=None):
+        """Rows of [position, full name, email, nickname, score, molecules].
+
+        Covers the last ``days`` local days including today, or all time
+        when None, best total score first.
+        """
+        since = 0
+        if days is not None:
+            now = time.time() if now is None else _timestamp(now)
+            since = local_day(now) - days + 1
+        rows = self._query(LEADERBOARD_QUERY, (since, limit))
+        return [
+            [position, full_name, email, nickname, round(score), molecules]
+            for position, (full_name, email, nickname, score, molecules)
+            in enumerate(rows, start=1)
+        ]
+
+    def recent(self, limit=20, user_id=None):
+        """The user's latest calculations as (molecule, score, date, CPU
+        time, settings), newest first."""
+        rows = self._query(
+            "SELECT molecule, score, date, cpu_time, settings FROM calculations "
+            "WHERE user_id = ? ORDER BY date DESC LIMIT ?",
+            (self.user_id if user_id is None else user_id, limit),
+        )
+        return [
+            (molecule, score, datetime.datetime.fromtimestamp(date), cpu_time, settings)
+            for molecule, score, date, cpu_time, settings in rows
+        ]
+
+    def best_scores(self):
+        """Best score ever recorded for each molecule."""
+        return dict(
+            self._query(
+                "SELECT molecule, MAX(score) FROM calculations GROUP BY molecule"
+            )
+        )
+
+    def close(self):
+        self._closed.set()
+        self._flusher.join()
+        with self._lock:
+            self._write()
+            self._connection.close()
+
+
+def benchmark(calculations, users, days):
+    import tempfile
+
+    import numpy as np
+
+    from work_queue import MOLECULES
+
+    path = os.path.join(tempfile.mkdtemp(), "history.sqlite3")
+    store = HistoryStore(path, user=("Local User", "", "local"))
+    user_ids = [
+        store.add_user(f"User {i}", f"user{i}@example.com", f"user{i}")
+        for i in range(users)
+    ]
+    rng = np.random.default_rng(0)
+    molecules = list(MOLECULES)
+    now = time.time()
+
+    # Calculations are recorded as they finish, so oldest first
+    dates = np.sort(now - rng.uniform(0, days * DAY_S, calculations))
+    started = time.perf_counter()
+    chunk = 100_000
+    for first in range(0, calculations, chunk):
+        n = min(chunk, calculations - first)
+        user = rng.choice(user_ids, n)
+        molecule = rng.integers(0, len(molecules), n)
+        score = rng.normal(1000, 150, n).round()
+        date = dates[first : first + n]
+        cpu_time = rng.uniform(0.05, 5.0, n)
+        for row in zip(user, molecule, score, date, cpu_time):
+            store.add(
+                molecules[row[1]], float(row[2]), float(row[3]), float(row[4]),
+                user_id=int(row[0]),
+            )
+    store.flush()
+    seconds = time.perf_counter() - started
+    print(
+        f"Recorded {calculations:,} calculations by {users} users over {days} "
+        f"days in {seconds:.1f}s ({calculations / seconds:,.0f}/s)"
+    )
+
+    for period, period_days in PERIODS.items():
+        started = time.perf_counter()
+        board = store.leaderboard(period_days)
+        milliseconds = (time.perf_counter() - started) * 1000
+        leader = board[0] if board else None
+        print(
+            f"{period:>13}: {milliseconds:6.2f} ms, leader {leader[3]} with "
+            f"{leader[4]:,} points from {leader[5]:,} molecules"
+            if leader
+            else f"{period:>13}: {milliseconds:6.2f} ms, empty"
+        )
+    started = time.perf_counter()
+    store.recent()
+    print(f"Recent calculations: {(time.perf_counter() - started) * 1000:.2f} ms")
+    store.close()
+    print(f"Database: {os.path.getsize(path) / 2**20:.0f} MB")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Time the calculation history's inserts and leaderboards."
+    )
+    parser.add_argument("--calculations", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--days", type=int, default=365)
+    args = parser.parse_args()
+    benchmark(args.calculations, args.users, args.days)
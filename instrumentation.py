@@ -0,0 +1,162 @@
+# scripts/instrumentation.py
+
+import cProfile
+import datetime
+import functools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import psutil
+
+REPORT_DIR = "reports"
+
+_lock = threading.Lock()
+_local = threading.local()
+_process = psutil.Process()
+_traced_frames = []  # Open spans on every thread, while tracemalloc traces
+
+_run = {
+    "started_at": datetime.datetime.now().isoformat(),
+    "spans": [],
+    "counters": {},
+    "metrics": {},
+}
+_profiler = None
+
+
+def _rss_mb():
+    return _process.memory_info().rss / 1e6
+
+
+def _peak_rss_mb():
+    try:
+        import resource
+    except ImportError:  # Windows has no getrusage; fall back to current RSS
+        return _rss_mb()
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 / 1e6
+
+
+def configure(trace_memory=False, profile=False):
+    """Opt in to tracemalloc peaks per span and/or a cProfile capture.
+
+    Both slow the pipeline down, so they are off unless asked for.
+    """
+    global _profiler
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if profile and _profiler is None:
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+@contextmanager
+def span(name):
+    """Record wall time, CPU time and memory for the enclosed block.
+
+    CPU time is process-wide so it includes XGBoost's native threads.
+    Memory is process-wide too, not per thread: ``rss_delta_mb`` and
+    ``traced_peak_mb`` include what other threads allocate meanwhile, and
+    ``process_peak_rss_mb`` is the process's peak RSS so far, not the
+    span's.
+    """
+    stack = _local.__dict__.setdefault("stack", [])
+    parent = stack[-1] if stack else None
+    frame = {"name": name, "traced_peak": 0}
+    stack.append(frame)
+
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        with _lock:
+            # Resetting the peak is process-wide, so every open span, on
+            # any thread, takes the peak so far first
+            peak = tracemalloc.get_traced_memory()[1]
+            for traced in _traced_frames:
+                traced["traced_peak"] = max(traced["traced_peak"], peak)
+            tracemalloc.reset_peak()
+            _traced_frames.append(frame)
+    rss_before = _rss_mb()
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    try:
+        yield
+    finally:
+        record = {
+            "name": name,
+            "parent": parent["name"] if parent else None,
+            "thread": threading.current_thread().name,
+            "wall_s": round(time.perf_counter() - wall_started, 6),
+            "cpu_s": round(time.process_time() - cpu_started, 6),
+            "rss_mb": round(_rss_mb(), 1),
+            "rss_delta_mb": round(_rss_mb() - rss_before, 1),
+            "process_peak_rss_mb": round(_peak_rss_mb(), 1),
+        }
+        if tracing:
+            with _lock:
+                peak = max(tracemalloc.get_traced_memory()[1], frame["traced_peak"])
+                _traced_frames.remove(frame)
+            record["traced_peak_mb"] = round(peak / 1e6, 1)
+        stack.pop()
+        with _lock:
+            _run["spans"].append(record)
+
+
+def timed(name=None):
+    """Decorator form of ``span``, named after the function by default."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name or func.__name__):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name, amount=1):
+    with _lock:
+        _run["counters"][name] = _run["counters"].get(name, 0) + amount
+
+
+def metric(name, value):
+    """Record a single measured value, e.g. time to first paint."""
+    with _lock:
+        _run["metrics"][name] = value
+
+
+def report():
+    with _lock:
+        return {
+            "started_at": _run["started_at"],
+            "pid": os.getpid(),
+            "peak_rss_mb": round(_peak_rss_mb(), 1),
+            "spans": list(_run["spans"]),
+            "counters": dict(_run["counters"]),
+            "metrics": dict(_run["metrics"]),
+        }
+
+
+def write_report(directory=REPORT_DIR):
+    """Write this run's spans and counters (and profile, if captured) to disk."""
+    os.makedirs(directory, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    path = os.path.join(directory, f"run-{stamp}-{os.getpid()}.json")
+    data = report()
+
+    if _profiler is not None:
+        _profiler.disable()
+        profile_path = path[: -len(".json")] + ".prof"
+        _profiler.dump_stats(profile_path)
+        data["profile"] = profile_path
+        _profiler.enable()
+
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+    print(f"Run report written to '{path}'.")
+    return path
@@ -0,0 +1,223 @@
+# scripts/job_store.py
+
+import pickle
+import sqlite3
+import threading
+
+from apscheduler.job import Job
+from apscheduler.jobstores.base import BaseJobStore, ConflictingIdError, JobLookupError
+from apscheduler.util import datetime_to_utc_timestamp, utc_timestamp_to_datetime
+
+import clock
+
+SCHEDULE_DB = "schedule.sqlite3"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS apscheduler_jobs (
+    id TEXT PRIMARY KEY,
+    next_run_time REAL,
+    job_state BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_apscheduler_jobs_next_run_time
+    ON apscheduler_jobs (next_run_time);
+CREATE TABLE IF NOT EXISTS computations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    intensity TEXT,
+    molecule TEXT,
+    conformers INTEGER,
+    status TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    score REAL,
+    cpu_time REAL
+);
+CREATE INDEX IF NOT EXISTS ix_computations_status ON computations (status);
+"""
+
+
+def connect(path=SCHEDULE_DB):
+    """Open the schedule database, creating its tables on first use."""
+    connection = sqlite3.connect(path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    return connection
+
+
+class SQLiteJobStore(BaseJobStore):
+    """APScheduler job store on the standard library's sqlite3.
+
+    Same table layout as APScheduler's SQLAlchemyJobStore (pickled job
+    state, indexed next_run_time) without needing SQLAlchemy, so the plan
+    survives restarts and due jobs are found with an index range scan.
+    """
+
+    def __init__(self, path=SCHEDULE_DB, pickle_protocol=pickle.HIGHEST_PROTOCOL):
+        super().__init__()
+        self.path = path
+        self.pickle_protocol = pickle_protocol
+        self._lock = threading.Lock()
+        self._connection = None
+
+    def start(self, scheduler, alias):
+        super().start(scheduler, alias)
+        self._connection = connect(self.path)
+
+    def _execute(self, sql, parameters=()):
+        with self._lock, self._connection:
+            return self._connection.execute(sql, parameters)
+
+    def lookup_job(self, job_id):
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT job_state FROM apscheduler_jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return self._reconstitute_job(row[0]) if row else None
+
+    def get_due_jobs(self, now):
+        if self._connection is None:  # Shut down while the scheduler polled
+            return []
+        return self._get_jobs(
+            "WHERE next_run_time <= ?", (datetime_to_utc_timestamp(now),)
+        )
+
+    def get_next_run_time(self):
+        if self._connection is None:
+            return None
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT next_run_time FROM apscheduler_jobs "
+                "WHERE next_run_time IS NOT NULL ORDER BY next_run_time LIMIT 1"
+            ).fetchone()
+        return utc_timestamp_to_datetime(row[0]) if row else None
+
+    def count_jobs(self):
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM apscheduler_jobs"
+            ).fetchone()[0]
+
+    def get_all_jobs(self):
+        jobs = self._get_jobs()
+        self._fix_paused_jobs_sorting(jobs)
+        return jobs
+
+    def add_job(self, job):
+        try:
+            self._execute(
+                "INSERT INTO apscheduler_jobs (id, next_run_time, job_state) "
+                "VALUES (?, ?, ?)",
+                (
+                    job.id,
+                    datetime_to_utc_timestamp(job.next_run_time),
+                    pickle.dumps(job.__getstate__(), self.pickle_protocol),
+                ),
+            )
+        except sqlite3.IntegrityError:
+            raise ConflictingIdError(job.id)
+
+    def update_job(self, job):
+        cursor = self._execute(
+            "UPDATE apscheduler_jobs SET next_run_time = ?, job_state = ? "
+            "WHERE id = ?",
+            (
+                datetime_to_utc_timestamp(job.next_run_time),
+                pickle.dumps(job.__getstate__(), self.pickle_protocol),
+                job.id,
+            ),
+        )
+        if cursor.rowcount == 0:
+            raise JobLookupError(job.id)
+
+    def remove_job(self, job_id):
+        cursor = self._execute("DELETE FROM apscheduler_jobs WHERE id = ?", (job_id,))
+        if cursor.rowcount == 0:
+            raise JobLookupError(job_id)
+
+    def remove_all_jobs(self):
+        self._execute("DELETE FROM apscheduler_jobs")
+
+    def shutdown(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def _reconstitute_job(self, job_state):
+        job_state = pickle.loads(job_state)
+        job_state["jobstore"] = self
+        job = Job.__new__(Job)
+        job.__setstate__(job_state)
+        job._scheduler = self._scheduler
+        job._jobstore_alias = self._alias
+        return job
+
+    def _get_jobs(self, where="", parameters=()):
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT id, job_state FROM apscheduler_jobs {where} "
+                "ORDER BY next_run_time",
+                parameters,
+            ).fetchall()
+
+        jobs = []
+        failed_job_ids = []
+        for job_id, job_state in rows:
+            try:
+                jobs.append(self._reconstitute_job(job_state))
+            except BaseException:
+                self._logger.exception(
+                    'Unable to restore job "%s" -- removing it', job_id
+                )
+                failed_job_ids.append(job_id)
+
+        # Remove all the jobs we failed to restore
+        for job_id in failed_job_ids:
+            self._execute("DELETE FROM apscheduler_jobs WHERE id = ?", (job_id,))
+        return jobs
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} (path={self.path})>"
+
+
+class ComputationJournal:
+    """Computations started by the scheduler and how they ended.
+
+    Lives in the same database as the jobs. A computation still marked
+    "running" after a restart was in flight when the process stopped.
+    """
+
+    def __init__(self, path=SCHEDULE_DB):
+        self._lock = threading.Lock()
+        self._connection = connect(path)
+
+    def _now(self):
+        return clock.now().isoformat()
+
+    def start(self, intensity, molecule=None, conformers=None):
+        with self._lock, self._connection:
+            cursor = self._connection.execute(
+                "INSERT INTO computations "
+                "(intensity, molecule, conformers, status, started_at) "
+                "VALUES (?, ?, ?, 'running', ?)",
+                (intensity, molecule, conformers, self._now()),
+            )
+        return cursor.lastrowid
+
+    def finish(self, computation_id, status="completed", score=None, cpu_time=None):
+        with self._lock, self._connection:
+            self._connection.execute(
+                "UPDATE computations SET status = ?, finished_at = ?, score = ?, "
+                "cpu_time = ? WHERE id = ?",
+                (status, self._now(), score, cpu_time, computation_id),
+            )
+
+    def in_flight(self):
+        """(id, intensity, molecule, conformers) of computations still running."""
+        with self._lock:
+            return self._connection.execute(
+                "SELECT id, intensity, molecule, conformers FROM computations "
+                "WHERE status = 'running' ORDER BY id"
+            ).fetchall()
+
+    def close(self):
+        self._connection.close()
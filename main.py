@@ -1,43 +1,195 @@
 # main.py
 
-from data_preparation import prepare_data, train_model, predict_future_usage
-from gui import ModernMolecularGUI, QApplication
-import threading
+import time
+
+# Taken before any heavy import so time-to-first-paint covers all of startup
+STARTED = time.perf_counter()
+
+import argparse
+import collections
+import os
 import sys
+import threading
+import traceback
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+from forecast_table import TABLE_PATH, ForecastTable, load_forecast
+from gui import ModernMolecularGUI, QApplication
+from history_store import HistoryStore
+import instrumentation
+
+HISTORY_WINDOW = 10000  # Most recent calculations kept in memory
+
+class CalculationRecord:
+    __slots__ = ('name', 'score', 'date', 'cpu_time')
+
+    def __init__(self, name, score, date, cpu_time):
+        self.name = name
+        self.score = score
+        self.date = date
+        self.cpu_time = cpu_time
 
 class ComputationManager:
-    def __init__(self):
-        self.current_calculation = {
+    """What is computing now and what has been computed.
+
+    Called from the scheduler's threads and the Qt thread, so its state is
+    private and read through ``current``, ``history`` and ``stats``, which
+    take the lock and return copies. Only the last ``history_window``
+    calculations are kept; the count, total CPU time and best score per
+    molecule cover all of them and are updated as each one is added. With
+    a ``history_store``, every calculation is also saved there for the
+    leaderboards.
+    """
+
+    def __init__(self, history_window=HISTORY_WINDOW, history_store=None):
+        self._lock = threading.Lock()
+        self.history_store = history_store
+        self._current = {
             'cycle': 0,
             'molecule': None,
             'status': 'idle'
         }
-        self.calculation_history = []
-        
+        self._history = collections.deque(maxlen=history_window)
+        self._count = 0
+        self._total_cpu_time = 0.0
+        self._best_scores = {}
+
     def update_current_calculation(self, cycle, molecule):
-        self.current_calculation['cycle'] = cycle
-        self.current_calculation['molecule'] = molecule
-        
+        with self._lock:
+            self._current['cycle'] = cycle
+            self._current['molecule'] = molecule
+
+    def start_calculation(self, molecule):
+        """Make ``molecule`` the current calculation, in the next cycle."""
+        with self._lock:
+            self._current['cycle'] += 1
+            self._current['molecule'] = molecule
+            return self._current['cycle']
+
     def add_to_history(self, name, score, date, cpu_time):
-        self.calculation_history.append({
-            'name': name,
-            'score': score,
-            'date': date,
-            'cpu_time': cpu_time
-        })
+        with self._lock:
+            self._history.append(
+                CalculationRecord(name, score, date, cpu_time)
+            )
+            self._count += 1
+            self._total_cpu_time += cpu_time or 0.0
+            best = self._best_scores.get(name)
+            if score is not None and (best is None or score > best):
+                self._best_scores[name] = score
+        if self.history_store is not None:
+            self.history_store.add(name, score, date, cpu_time)
 
-def main():
-    # Step 1: Prepare data and train model
-    print("Preparing data and training model...")
+    def current(self):
+        with self._lock:
+            return dict(self._current)
+
+    def history(self):
+        """The calculations in the window, oldest first."""
+        with self._lock:
+            return list(self._history)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'count': self._count,
+                'total_cpu_time': self._total_cpu_time,
+                'best_scores': dict(self._best_scores),
+            }
+
+class ForecastUpdates(QObject):
+    # Carries a background forecast, or why it failed, back to the Qt thread
+    ready = pyqtSignal(object, object)
+    failed = pyqtSignal(str)
+
+
+@instrumentation.timed()
+def run_pipeline():
+    # Imported here so a fast start never waits for them
+    from data_preparation import (
+        prepare_data,
+        load_inference_model,
+        predict_future_usage,
+    )
+    from forecast_table import forecast_table, save_forecast
+
+    # Step 1: Prepare data and load the model, training it only when stale
+    print("Preparing data and loading model...")
     df = prepare_data()
-    model = train_model(df)
+    model = load_inference_model(df)
 
     # Step 2: Predict future usage
     print("Predicting future usage patterns...")
     future_df = predict_future_usage(model, df)
+    table = forecast_table(model)
+    save_forecast(future_df)
+    return future_df, table
+
+
+def refresh_forecast(updates):
+    """Run the pipeline on a background thread and hand the result over.
+
+    A failure is printed with its traceback and reported through
+    ``updates.failed``; the window keeps the forecast it has.
+    """
+    try:
+        future_df, table = run_pipeline()
+    except Exception as error:
+        traceback.print_exc()
+        instrumentation.count('forecast_refresh_failures')
+        updates.failed.emit(f"{type(error).__name__}: {error}")
+        return
+    updates.ready.emit(future_df, table)
+
+
+def load_saved_forecast():
+    future_df = load_forecast()
+    if future_df is None:
+        return None, None
+    table = ForecastTable.load() if os.path.exists(TABLE_PATH) else None
+    return future_df, table
+
+
+def report_first_paint():
+    elapsed = time.perf_counter() - STARTED
+    instrumentation.metric('time_to_first_paint_s', round(elapsed, 3))
+    print(f"Time to first paint: {elapsed:.2f}s")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Molecular Universe")
+    parser.add_argument(
+        '--full-start',
+        action='store_true',
+        help="Run the whole pipeline before opening the window",
+    )
+    parser.add_argument(
+        '--profile',
+        action='store_true',
+        help="Capture a cProfile of the run next to its JSON report",
+    )
+    parser.add_argument(
+        '--trace-memory',
+        action='store_true',
+        help="Record tracemalloc peaks for each pipeline stage",
+    )
+    return parser.parse_known_args()[0]
+
+
+def main():
+    args = parse_args()
+    instrumentation.configure(trace_memory=args.trace_memory, profile=args.profile)
+
+    # Fast start: open the window on the last saved forecast and refresh it
+    # in the background. Without a saved forecast, run the pipeline first.
+    future_df, table = (None, None) if args.full_start else load_saved_forecast()
+    refresh_in_background = future_df is not None
+    if future_df is None:
+        future_df, table = run_pipeline()
 
     # Step 3: Initialize computation manager
-    computation_manager = ComputationManager()
+    history_store = HistoryStore()
+    computation_manager = ComputationManager(history_store=history_store)
 
     # # Step 4: Start the scheduler in a separate thread
     # print("Starting computation scheduler...")
@@ -52,9 +204,24 @@ def main():
     print("Launching Molecular Universe interface...")
     app = QApplication(sys.argv)
     app.setStyle("Fusion")
-    gui = ModernMolecularGUI(future_df, computation_manager)
+    gui = ModernMolecularGUI(future_df, computation_manager, forecast_table=table)
     gui.show()
-    sys.exit(app.exec_())
+    QTimer.singleShot(0, report_first_paint)
+
+    if refresh_in_background:
+        updates = ForecastUpdates()
+        updates.ready.connect(gui.update_forecast)
+        updates.failed.connect(gui.forecast_refresh_failed)
+        threading.Thread(
+            target=refresh_forecast,
+            args=(updates,),
+            daemon=True,
+        ).start()
+
+    exit_code = app.exec_()
+    history_store.close()
+    instrumentation.write_report()
+    sys.exit(exit_code)
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
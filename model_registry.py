@@ -0,0 +1,129 @@
+# scripts/model_registry.py
+
+import datetime
+import hashlib
+import json
+import os
+import platform
+from importlib import metadata
+
+import joblib
+import pandas as pd
+
+MODEL_DIR = "models"
+MODEL_NAME = "idle_time_predictor"
+
+# Libraries whose versions decide whether a pickled model can be reused
+TRACKED_LIBRARIES = ["xgboost", "scikit-learn", "numpy", "pandas", "joblib"]
+
+# Manifest keys that are informational only and never invalidate a model
+UNCHECKED_KEYS = {
+    "trained_at",
+    "metrics",
+    "trained_through",
+    "trained_rows",
+    "trained_fingerprint",
+    "model_version",
+    "incremental_updates",
+}
+
+
+def model_paths(name=MODEL_NAME):
+    base = os.path.join(MODEL_DIR, name)
+    return base + ".pkl", base + ".json"
+
+
+def library_versions():
+    versions = {"python": platform.python_version()}
+    for library in TRACKED_LIBRARIES:
+        try:
+            versions[library] = metadata.version(library)
+        except metadata.PackageNotFoundError:
+            versions[library] = None
+    return versions
+
+
+def data_fingerprint(df, columns):
+    """SHA-256 over the values of ``columns``, independent of the index."""
+    hashes = pd.util.hash_pandas_object(df[columns], index=False).to_numpy()
+    return hashlib.sha256(hashes.tobytes()).hexdigest()
+
+
+def build_manifest(df, feature_cols, params, features_version, target_col="Target"):
+    return {
+        "data_fingerprint": data_fingerprint(df, feature_cols + [target_col]),
+        "rows": len(df),
+        "feature_cols": list(feature_cols),
+        "features_version": features_version,
+        "params": params,
+        "versions": library_versions(),
+    }
+
+
+def _comparable(manifest, ignore=()):
+    return {
+        k: v
+        for k, v in manifest.items()
+        if k not in UNCHECKED_KEYS and k not in ignore
+    }
+
+
+def load_manifest(name=MODEL_NAME):
+    _, manifest_path = model_paths(name)
+    try:
+        with open(manifest_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def is_current(manifest, name=MODEL_NAME):
+    """Whether the registered model matches ``manifest``, without loading it."""
+    model_path, _ = model_paths(name)
+    saved = load_manifest(name)
+    return (
+        saved is not None
+        and os.path.exists(model_path)
+        and _comparable(saved) == _comparable(manifest)
+    )
+
+
+def load_model(manifest, name=MODEL_NAME, ignore=()):
+    """Return the registered model if it was trained for ``manifest``, else None.
+
+    Keys in ``ignore`` are not compared, e.g. the data fingerprint when the
+    caller only needs a model with the same configuration to continue from.
+    """
+    model_path, _ = model_paths(name)
+    saved = load_manifest(name)
+    if saved is None or not os.path.exists(model_path):
+        return None
+    if _comparable(saved, ignore) != _comparable(manifest, ignore):
+        changed = sorted(
+            key
+            for key in _comparable(saved, ignore).keys() | manifest.keys()
+            if key not in UNCHECKED_KEYS
+            and key not in ignore
+            and saved.get(key) != manifest.get(key)
+        )
+        print(f"Registered model is stale ({', '.join(changed)} changed).")
+        return None
+    print(f"Loaded registered model trained at {saved.get('trained_at')}.")
+    return joblib.load(model_path)
+
+
+def save_model(model, manifest, name=MODEL_NAME):
+    model_path, manifest_path = model_paths(name)
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    manifest = dict(manifest, trained_at=datetime.datetime.now().isoformat())
+
+    # Drop the old manifest first and write the new one last, so a manifest
+    # never describes a model other than the one on disk
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    joblib.dump(model, model_path + ".tmp")
+    os.replace(model_path + ".tmp", model_path)
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    print(f"Model saved to '{model_path}' with manifest '{manifest_path}'.")
@@ -0,0 +1,217 @@
+# scripts/preemption.py
+
+import argparse
+import subprocess
+import sys
+import threading
+import time
+
+import psutil
+
+from instrumentation import count, metric
+
+SAMPLE_INTERVAL_S = 0.2
+SUSPEND_ABOVE = 30.0  # Foreground load, in % of the whole machine
+RESUME_BELOW = 15.0
+CALM_SAMPLES = 5  # Consecutive samples below RESUME_BELOW before resuming
+
+
+def _busy_seconds(times):
+    # guest time is already counted in user time on Linux
+    total = sum(times) - getattr(times, "guest", 0) - getattr(times, "guest_nice", 0)
+    return total - times.idle - getattr(times, "iowait", 0)
+
+
+class LoadMonitor:
+    """Suspends the engine's workers while the user keeps the machine busy.
+
+    Every SAMPLE_INTERVAL_S it measures the system's CPU time minus the
+    time spent by this process and its children (the engine's workers),
+    so the harvested computation never counts as foreground load. Workers
+    are suspended on the first sample above SUSPEND_ABOVE and resumed
+    after CALM_SAMPLES samples below RESUME_BELOW.
+    """
+
+    def __init__(
+        self,
+        engine,
+        suspend_above=SUSPEND_ABOVE,
+        resume_below=RESUME_BELOW,
+        interval=SAMPLE_INTERVAL_S,
+    ):
+        self.engine = engine
+        self.suspend_above = suspend_above
+        self.resume_below = resume_below
+        self.interval = interval
+        self.cores = psutil.cpu_count() or 1
+        self.events = []  # (time, "suspend" | "resume", foreground %, latency s)
+        self._process = psutil.Process()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _own_seconds(self, previous):
+        """CPU-seconds used by this process tree since ``previous``.
+
+        ``previous`` maps each PID to its own CPU time and that of the
+        children it has reaped. A worker that exits between samples is
+        dropped, and the time it used since the last sample is counted
+        from what its parent reaped. Time that the tree never gets back
+        is left out, never subtracted.
+        """
+        current = {}
+        try:
+            # The workers, plus multiprocessing's helper processes
+            processes = [self._process] + self._process.children(recursive=True)
+        except psutil.NoSuchProcess:
+            processes = [self._process]
+        for process in processes:
+            try:
+                times = process.cpu_times()
+            except psutil.NoSuchProcess:
+                continue
+            current[process.pid] = (
+                times.user + times.system,
+                times.children_user + times.children_system,
+            )
+        used = reaped = 0.0
+        for pid, (own, children) in current.items():
+            own_before, children_before = previous.get(pid, (0.0, 0.0))
+            used += own - own_before
+            reaped += children - children_before
+        # The reaped time includes what gone PIDs used before the last sample
+        gone = sum(sum(previous[pid]) for pid in previous.keys() - current.keys())
+        used += max(reaped - gone, 0.0)
+        return max(used, 0.0), current
+
+    def foreground_percent(self, sample, previous):
+        """Foreground load between two ``sample()`` results, in % of the machine."""
+        wall = sample[0] - previous[0]
+        if wall <= 0:
+            return 0.0
+        system = _busy_seconds(sample[1]) - _busy_seconds(previous[1])
+        own, _ = sample[2]
+        load = (system - own) / (wall * self.cores) * 100
+        return min(max(load, 0.0), 100.0)
+
+    def sample(self, previous=None):
+        own = self._own_seconds(previous[2][1] if previous else {})
+        return time.perf_counter(), psutil.cpu_times(), own
+
+    def _run(self):
+        previous = self.sample()
+        calm = 0
+        while not self._stop.wait(self.interval):
+            current = self.sample(previous)
+            load = self.foreground_percent(current, previous)
+            if not self.engine.suspended and load > self.suspend_above:
+                self.engine.suspend()
+                # The load rose at some point after the previous sample
+                self._record("suspend", load, previous[0])
+                calm = 0
+            elif self.engine.suspended:
+                calm = calm + 1 if load < self.resume_below else 0
+                if calm >= CALM_SAMPLES:
+                    self.engine.resume()
+                    self._record("resume", load, current[0])
+            previous = current
+
+    def _record(self, action, load, since):
+        now = time.perf_counter()
+        latency = now - since
+        self.events.append((now, action, round(load, 1), round(latency, 3)))
+        count(f"preemption_{action}s")
+        if action == "suspend":
+            metric("preemption_latency_s", round(latency, 3))
+        print(
+            f"Foreground load {load:.0f}%: workers {action}"
+            f"{'ed' if action == 'suspend' else 'd'} after {latency * 1000:.0f} ms."
+        )
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="LoadMonitor", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self.engine.suspended:
+            self.engine.resume()
+
+
+def _start_foreground_load(seconds):
+    """Busy-loop one core for ``seconds`` in a process that is not ours.
+
+    The loop runs in a grandchild whose parent exits at once, so it is not
+    one of our descendants and counts as the user's load.
+    """
+    loop = (
+        f"import time\ndeadline = time.perf_counter() + {seconds}\n"
+        "while time.perf_counter() < deadline: pass"
+    )
+    launcher = (
+        f"import subprocess, sys; subprocess.Popen([sys.executable, '-c', {loop!r}])"
+    )
+    subprocess.run([sys.executable, "-c", launcher], check=True)
+
+
+def benchmark(cores, busy_seconds):
+    from engine import ComputationEngine
+    from scoring import score_conformer
+
+    engine = ComputationEngine(cores)
+    engine.set_intensity("HIGH")
+    monitor = LoadMonitor(engine)
+    feeding = threading.Event()
+    feeding.set()
+
+    def feed():
+        index = 0
+        while feeding.is_set():
+            engine.submit(score_conformer, "Ethanol (C2H5OH)", index, timeout=0.1)
+            index += 1
+
+    feeder = threading.Thread(target=feed, daemon=True)
+    feeder.start()
+    time.sleep(3)  # Let the workers spawn and settle
+    monitor.start()
+    time.sleep(1)
+
+    # Stand-ins for the user's programs, one per core
+    for _ in range(monitor.cores):
+        _start_foreground_load(busy_seconds)
+    started = time.perf_counter()
+    while not engine.suspended and time.perf_counter() - started < busy_seconds:
+        time.sleep(0.005)
+    suspended_after = time.perf_counter() - started
+
+    time.sleep(max(started + busy_seconds - time.perf_counter(), 0))
+    finished = time.perf_counter()
+    while engine.suspended and time.perf_counter() - finished < 10:
+        time.sleep(0.005)
+    resumed_after = time.perf_counter() - finished
+
+    monitor.stop()
+    feeding.clear()
+    feeder.join()
+    engine.shutdown()
+
+    print(f"Cores: {monitor.cores}, sample interval: {monitor.interval}s")
+    print(f"Foreground load started -> workers suspended: {suspended_after:.3f}s")
+    print(f"Foreground load ended   -> workers resumed:   {resumed_after:.3f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure how quickly workers yield to foreground load."
+    )
+    parser.add_argument("--cores", type=int, default=None)
+    parser.add_argument("--busy-seconds", type=float, default=3.0)
+    args = parser.parse_args()
+    benchmark(args.cores, args.busy_seconds)
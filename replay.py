@@ -0,0 +1,265 @@
+# scripts/replay.py
+
+import argparse
+import collections
+import contextlib
+import io
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from clock import VirtualClock, use_clock
+from preemption import SUSPEND_ABOVE
+from schedule_windows import SLOT, forecast_windows, intensity_cores
+from work_queue import WorkQueue, pack_schedule, sample_calculations
+
+# Intensity each policy runs at, given the forecast window's intensity
+POLICIES = {
+    "forecast": lambda intensity: intensity,  # What scheduler.py does
+    "idle_only": lambda intensity: "HIGH" if intensity == "HIGH" else None,
+    "always_high": lambda intensity: "HIGH",  # Leaves it all to preemption
+}
+
+
+class ReplayComputations:
+    """Stands in for the slot manager in simulation.py during a replay.
+
+    The scheduler's job bodies start, stop and submit computations here
+    as they would on the engine, and ``run`` spends virtual CPU time on
+    the submitted calculations, oldest first. Stopping keeps their
+    progress, as their checkpoints would. Status callbacks are not called.
+    """
+
+    def __init__(self, cores=None):
+        self.cores = cores
+        self.intensity = None
+        self.running = collections.deque()  # [calculation, CPU-seconds left]
+        self.submitted = 0
+
+    def start_intensity_computation(self, intensity):
+        self.intensity = intensity
+
+    def stop_computation(self):
+        self.intensity = None
+
+    def submit_computation(
+        self, calculation, on_status=None, cores=1, block=True, timeout=None
+    ):
+        self.running.append([calculation, float(calculation.cpu_seconds)])
+        self.submitted += 1
+        return True
+
+    def work_left(self):
+        return sum(left for _, left in self.running)
+
+    def run(self, cpu_seconds):
+        """Spend ``cpu_seconds`` on the calculations; returns how many finished."""
+        finished = 0
+        while cpu_seconds > 0 and self.running:
+            entry = self.running[0]
+            spent = min(entry[1], cpu_seconds)
+            entry[1] -= spent
+            cpu_seconds -= spent
+            if entry[1] <= 0:
+                self.running.popleft()
+                finished += 1
+        return finished
+
+
+def backlog(future_df, cores=None, rng=0):
+    """Sample calculations enough to keep every core busy for the horizon."""
+    horizon_s = len(future_df) * SLOT.total_seconds()
+    needed = intensity_cores("HIGH", cores) * horizon_s
+    rng = np.random.default_rng(rng)
+    calculations = []
+    while needed > 0:
+        calculations.extend(sample_calculations(256, rng))
+        needed -= sum(c.cpu_seconds for c in calculations[-256:])
+    return calculations
+
+
+def replay(
+    future_df,
+    actual_usage=None,
+    policy="forecast",
+    cores=None,
+    calculations=None,
+    preempt=True,
+):
+    """Fire the scheduler's window jobs for ``future_df`` on a virtual clock.
+
+    The queued ``calculations`` (by default, ``backlog``) are packed into
+    the forecast's windows as ``plan_calculations`` does. The clock then
+    jumps from one job's run time to the next, and each job runs
+    ``scheduler.run_window`` at the intensity the policy picks, which
+    submits the window's calculations to a ``ReplayComputations``. Until
+    the next job, they run on every core the intensity allows, as if the
+    work could be shared among the cores, and stop when it runs out.
+
+    ``actual_usage`` is the user's CPU usage (%) for each forecast slot.
+    With ``preempt``, slots above the load monitor's threshold harvest
+    nothing, as the monitor would suspend the workers. Without it, the CPU
+    harvested in them is counted as interference.
+
+    Returns a trace with one row per intensity transition.
+    """
+    import scheduler
+    from scheduler import schedule_state
+
+    choose = POLICIES[policy]
+    timestamps = pd.DatetimeIndex(future_df["Timestamp"])
+    slot_seconds = SLOT.total_seconds()
+    if actual_usage is None:
+        busy = np.zeros(len(timestamps), dtype=bool)
+    else:
+        busy = np.asarray(actual_usage) > SUSPEND_ABOVE
+    horizon_end = timestamps[-1] + SLOT
+    if calculations is None:
+        calculations = backlog(future_df, cores)
+
+    virtual = VirtualClock(timestamps[0].to_pydatetime())
+    computations = ReplayComputations(cores)
+    queue = WorkQueue(calculations)
+    rows = []
+    saved = dict(schedule_state)
+    try:
+        schedule_state.update(
+            computation_manager=None,
+            active_intensity=None,
+            journal=None,
+            queue=queue,
+            computations=computations,
+        )
+        schedule_state['plan'], _ = pack_schedule(
+            forecast_windows(future_df), queue.pending(), cores=cores,
+            now=timestamps[0],
+        )
+        # The job bodies report every window; a replay fires thousands
+        with use_clock(virtual), contextlib.redirect_stdout(io.StringIO()):
+            jobs = sorted(scheduler.window_jobs(future_df, now=virtual.now()).values())
+            for i, (run_time, (intensity,)) in enumerate(jobs):
+                virtual.advance_to(run_time)
+                intensity = choose(intensity)
+                scheduler.run_window(intensity)
+                if rows and rows[-1]["Intensity"] == intensity:
+                    continue_from = rows.pop()  # Same intensity: extend the row
+                else:
+                    continue_from = None
+
+                until = jobs[i + 1][0] if i + 1 < len(jobs) else horizon_end
+                first, last = timestamps.searchsorted([run_time, until])
+                workers = intensity_cores(computations.intensity, cores)
+                capacity = np.full(last - first, workers * slot_seconds)
+                if preempt:
+                    capacity[busy[first:last]] = 0
+                harvested = np.minimum(np.cumsum(capacity), computations.work_left())
+                harvested_s = float(harvested[-1]) if len(harvested) else 0.0
+                finished = computations.run(harvested_s)
+                ran = np.diff(harvested, prepend=0.0)
+
+                row = continue_from or {
+                    "Time": run_time,
+                    "Intensity": intensity,
+                    "Cores": workers,
+                    "Slots": 0,
+                    "Harvested_CPU_s": 0.0,
+                    "Preempted_s": 0.0,
+                    "Interference_s": 0.0,
+                    "Finished": 0,
+                }
+                row["Slots"] += last - first
+                row["Harvested_CPU_s"] += harvested_s
+                row["Finished"] += finished
+                if preempt:
+                    preempted = workers * slot_seconds * busy[first:last].sum()
+                    row["Preempted_s"] += float(preempted)
+                else:
+                    row["Interference_s"] += float(ran[busy[first:last]].sum())
+                row["Backlog_s"] = computations.work_left() + sum(
+                    c.cpu_seconds for c in queue.pending()
+                )
+                rows.append(row)
+    finally:
+        schedule_state.update(saved)
+    return pd.DataFrame(rows)
+
+
+def summarize(trace):
+    return {
+        "transitions": len(trace),
+        "harvested_cpu_h": trace["Harvested_CPU_s"].sum() / 3600,
+        "preempted_cpu_h": trace["Preempted_s"].sum() / 3600,
+        "interference_cpu_h": trace["Interference_s"].sum() / 3600,
+        "finished": int(trace["Finished"].sum()),
+    }
+
+
+def _replay_forecast(start, periods):
+    from forecast_table import (
+        REFERENCE_MONDAY,
+        SLOTS_PER_WEEK,
+        TABLE_PATH,
+        ForecastTable,
+    )
+
+    if os.path.exists(TABLE_PATH):
+        table = ForecastTable.load()
+    else:
+        # No trained model yet: forecast each slot's mean usage from data.py
+        from data import USAGE_BANDS, usage_band_index
+        from features import usage_levels
+
+        slots = pd.date_range(
+            REFERENCE_MONDAY, periods=SLOTS_PER_WEEK, freq="15min"
+        )
+        means = np.array([mean for mean, _ in USAGE_BANDS])
+        table = ForecastTable(usage_levels(means[usage_band_index(slots)]))
+    return table.forecast(start=start, periods=periods)
+
+
+def benchmark(periods, cores, seed, output):
+    from data import generate_usage
+
+    start = pd.Timestamp.now().ceil("15min")
+    future_df = _replay_forecast(start, periods)
+    actual = generate_usage(future_df["Timestamp"], rng=np.random.default_rng(seed))
+    print(f"Replaying {periods} slots ({periods / 96:.0f} days) on {cores} cores")
+
+    for policy in POLICIES:
+        for preempt in (True, False):
+            started = time.perf_counter()
+            trace = replay(
+                future_df,
+                actual["CPU_Usage"],
+                policy=policy,
+                cores=cores,
+                preempt=preempt,
+            )
+            seconds = time.perf_counter() - started
+            summary = summarize(trace)
+            print(
+                f"{policy:>11} {'preempt' if preempt else 'no preempt':>10}: "
+                f"{summary['transitions']:5d} transitions, "
+                f"{summary['harvested_cpu_h']:8.1f} CPU-h harvested, "
+                f"{summary['preempted_cpu_h']:7.1f} preempted, "
+                f"{summary['interference_cpu_h']:7.1f} interfering, "
+                f"{summary['finished']:5d} calculations finished ({seconds:.2f}s)"
+            )
+            if output and policy == "forecast" and preempt:
+                trace.to_csv(output, index=False)
+    if output:
+        print(f"Trace of the forecast policy written to '{output}'.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Replay the schedule on a virtual clock and compare policies."
+    )
+    parser.add_argument("--periods", type=int, default=96 * 7)  # One week
+    parser.add_argument("--cores", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="CSV file for the forecast policy's trace")
+    args = parser.parse_args()
+    benchmark(args.periods, args.cores, args.seed, args.output)
@@ -0,0 +1,195 @@
+# scripts/result_cache.py
+
+import argparse
+import hashlib
+import importlib
+import inspect
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+CACHE_PATH = os.path.join("cache", "results.sqlite3")
+MAX_BYTES = 64 * 1024 * 1024
+# Stored size of one result: the hex key plus three 8-byte REALs
+ENTRY_BYTES = 64 + 3 * 8
+
+# Version of the calculation settings shown in the GUI's "Settings" column
+SETTINGS_VERSION = "1.0.0"
+# Modules whose source decides a calculation's result
+CODE_MODULES = ["scoring"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    score REAL,
+    cpu_seconds REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ix_results_last_used ON results (last_used);
+"""
+
+_code_version = None
+
+
+def code_version():
+    """Hash of the source of CODE_MODULES, computed once per process."""
+    global _code_version
+    if _code_version is None:
+        digest = hashlib.sha256()
+        for name in CODE_MODULES:
+            digest.update(inspect.getsource(importlib.import_module(name)).encode())
+        _code_version = digest.hexdigest()[:16]
+    return _code_version
+
+
+def result_key(calculation, settings_version=SETTINGS_VERSION):
+    """Content address of a calculation's result.
+
+    Covers what the result depends on: the molecule and its conformers,
+    the settings version and the code that computes it.
+    """
+    identity = {
+        "molecule": calculation.molecule,
+        "conformers": calculation.conformers,
+        "settings": settings_version,
+        "code": code_version(),
+    }
+    return hashlib.sha256(json.dumps(identity, sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+    """Calculation results on disk, evicted least recently used first.
+
+    A result is a calculation's ``score`` and ``cpu_seconds``, stored as a
+    row of one SQLite file under its ``result_key``. Once the stored results
+    pass ``max_bytes``, the ones used longest ago are dropped.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_BYTES):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+        # Running count, so a put need not scan the table to enforce max_bytes
+        self._entries = self._connection.execute(
+            "SELECT COUNT(*) FROM results"
+        ).fetchone()[0]
+
+    def get(self, key):
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT score, cpu_seconds FROM results WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self._connection.execute(
+                "UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key)
+            )
+            self.hits += 1
+        return {"score": row[0], "cpu_seconds": row[1]}
+
+    def contains(self, key):
+        """Whether ``key`` is cached, without counting a hit or a use."""
+        with self._lock:
+            return self._connection.execute(
+                "SELECT 1 FROM results WHERE key = ?", (key,)
+            ).fetchone() is not None
+
+    def put(self, key, result):
+        with self._lock, self._connection:
+            stored = self._connection.execute(
+                "UPDATE results SET score = ?, cpu_seconds = ?, last_used = ? "
+                "WHERE key = ?",
+                (result["score"], result["cpu_seconds"], time.time(), key),
+            ).rowcount
+            if not stored:
+                self._connection.execute(
+                    "INSERT INTO results (key, score, cpu_seconds, last_used) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, result["score"], result["cpu_seconds"], time.time()),
+                )
+                self._entries += 1
+                self._evict()
+
+    def _evict(self):
+        excess = self._entries - self.max_bytes // ENTRY_BYTES
+        if excess <= 0:
+            return
+        self._connection.execute(
+            "DELETE FROM results WHERE key IN "
+            "(SELECT key FROM results ORDER BY last_used LIMIT ?)",
+            (excess,),
+        )
+        self._entries -= excess
+
+    def stats(self):
+        return {
+            "entries": self._entries,
+            "bytes": self._entries * ENTRY_BYTES,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+    def close(self):
+        self._connection.close()
+
+
+_cache = None
+
+
+def result_cache():
+    """The process-wide cache, opened on first use."""
+    global _cache
+    if _cache is None:
+        _cache = ResultCache()
+    return _cache
+
+
+def benchmark(calculations, max_bytes):
+    import tempfile
+
+    from work_queue import sample_calculations
+
+    path = os.path.join(tempfile.mkdtemp(), "results.sqlite3")
+    cache = ResultCache(path, max_bytes=max_bytes)
+    rng = np.random.default_rng(0)
+    started = time.perf_counter()
+    for calculation in sample_calculations(calculations, rng=0):
+        key = result_key(calculation)
+        if cache.get(key) is None:
+            cache.put(
+                key,
+                {
+                    "score": float(rng.normal(900, 100)),
+                    "cpu_seconds": float(calculation.cpu_seconds),
+                },
+            )
+    seconds = time.perf_counter() - started
+    stats = cache.stats()
+    print(
+        f"{calculations} calculations: {stats['hits']} served from cache, "
+        f"{stats['misses']} computed ({stats['hits'] / calculations:.1%} hit rate)"
+    )
+    print(
+        f"{stats['entries']} results in {stats['bytes']:,} bytes, "
+        f"{seconds / calculations * 1e6:.0f} us per lookup"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exercise the result cache.")
+    parser.add_argument("--calculations", type=int, default=10000)
+    parser.add_argument("--max-bytes", type=int, default=MAX_BYTES)
+    args = parser.parse_args()
+    benchmark(args.calculations, args.max_bytes)
@@ -0,0 +1,113 @@
+# scripts/schedule_windows.py
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+SLOT = pd.Timedelta(minutes=15)
+
+# Calculation intensity for each predicted status; None means stop
+INTENSITY_BY_STATUS = {0: "HIGH", 1: "MEDIUM", 2: "LOW", 3: None}
+
+
+def intensity_cores(intensity, cores=None):
+    """Cores a computation may use: all for HIGH, half for MEDIUM, one for LOW."""
+    cores = cores or os.cpu_count() or 1
+    return {"HIGH": cores, "MEDIUM": max(cores // 2, 1), "LOW": 1}.get(intensity, 0)
+
+
+def forecast_windows(future_df):
+    """Merge consecutive same-status slots of a forecast into windows.
+
+    Returns one row per window with its Start, End (exclusive), Slots,
+    Predicted_Status and Intensity. A window also ends wherever the
+    forecast skips a slot, so a gap never gets merged over.
+    """
+    timestamps = future_df["Timestamp"].to_numpy()
+    statuses = future_df["Predicted_Status"].to_numpy()
+    if len(statuses) == 0:
+        return pd.DataFrame(
+            columns=["Start", "End", "Slots", "Predicted_Status", "Intensity"]
+        )
+
+    # Change points: the status changes or the next slot is not contiguous
+    changed = (statuses[1:] != statuses[:-1]) | (
+        np.diff(timestamps) != SLOT.to_timedelta64()
+    )
+    starts = np.concatenate([[0], np.flatnonzero(changed) + 1])
+    ends = np.concatenate([starts[1:], [len(statuses)]])
+
+    windows = pd.DataFrame(
+        {
+            "Start": timestamps[starts],
+            "End": timestamps[ends - 1] + SLOT.to_timedelta64(),
+            "Slots": ends - starts,
+            "Predicted_Status": statuses[starts],
+        }
+    )
+    windows["Intensity"] = windows["Predicted_Status"].map(INTENSITY_BY_STATUS)
+    return windows
+
+
+def _benchmark_forecast(periods):
+    from forecast_table import SLOTS_PER_WEEK, TABLE_PATH, ForecastTable
+
+    if os.path.exists(TABLE_PATH):
+        table = ForecastTable.load()
+    else:
+        # No trained model yet: use a random weekly pattern with long runs
+        rng = np.random.default_rng(0)
+        table = ForecastTable(np.repeat(rng.integers(0, 4, SLOTS_PER_WEEK // 8), 8))
+    return table.forecast(start=pd.Timestamp.now().ceil("15min"), periods=periods)
+
+
+def benchmark():
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    def noop(*args):
+        pass
+
+    for name, periods in [("1 week", 96 * 7), ("1 year", 96 * 365)]:
+        future_df = _benchmark_forecast(periods)
+
+        # One job per 15-minute row, as scheduler.py used to register them
+        scheduler = BackgroundScheduler()
+        started = time.perf_counter()
+        for idx, row in future_df.iterrows():
+            if row["Predicted_Status"] in (0, 1, 2):
+                scheduler.add_job(
+                    noop,
+                    "date",
+                    run_date=row["Timestamp"].to_pydatetime(),
+                    id=f"computation_{idx}",
+                )
+        per_row_seconds = time.perf_counter() - started
+        per_row_jobs = len(scheduler.get_jobs())
+
+        # One job per merged window
+        scheduler = BackgroundScheduler()
+        started = time.perf_counter()
+        windows = forecast_windows(future_df)
+        for window in windows.itertuples():
+            scheduler.add_job(
+                noop,
+                "date",
+                run_date=window.Start.to_pydatetime(),
+                id=f"window_{window.Start:%Y%m%dT%H%M}",
+            )
+        window_seconds = time.perf_counter() - started
+        window_jobs = len(scheduler.get_jobs())
+
+        print(f"{name} ({periods} slots):")
+        print(f"  per row:    {per_row_jobs:6d} jobs  {per_row_seconds:8.3f}s")
+        print(f"  per window: {window_jobs:6d} jobs  {window_seconds:8.3f}s")
+
+
+if __name__ == "__main__":
+    argparse.ArgumentParser(
+        description="Benchmark schedule setup per row vs per window."
+    ).parse_args()
+    benchmark()
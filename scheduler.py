@@ -1,67 +1,452 @@
 # scripts/scheduler.py
 
+from apscheduler.jobstores.base import JobLookupError
 from apscheduler.schedulers.background import BackgroundScheduler
-import datetime
+from apscheduler.util import convert_to_datetime
+import bisect
+import collections
+import numpy as np
+import pandas as pd
 import time
-import random
 
-from simulation import (
-    start_high_intensity_computation,
-    start_medium_intensity_computation,
-    start_low_intensity_computation,
-    stop_computation,
+import clock
+import simulation
+from instrumentation import count, timed
+from result_cache import result_cache, result_key
+from job_store import SCHEDULE_DB, ComputationJournal, SQLiteJobStore
+from schedule_windows import SLOT, forecast_windows
+from work_queue import (
+    MOLECULES,
+    WorkQueue,
+    assignment_at,
+    calculation,
+    pack_schedule,
+    print_packing_report,
+    sample_calculations,
 )
 
-def schedule_computations(future_df, computation_manager):
-    scheduler = BackgroundScheduler()
-    
-    for idx, row in future_df.iterrows():
-        run_time = row['Timestamp'].to_pydatetime()
-        predicted_status = row['Predicted_Status']
-        
-        # Create unique job IDs
-        job_id = f'computation_{idx}'
-        
-        if predicted_status == 0:  # Idle
-            scheduler.add_job(
-                start_computation,
-                'date',
-                run_date=run_time,
-                id=job_id,
-                args=[computation_manager, 'HIGH']
+# Shared with the scheduled jobs, whose arguments stay plain values so
+# they can be pickled into the job store
+schedule_state = {
+    'computation_manager': None,
+    'active_intensity': None,
+    'journal': None,
+    'job_store': None,
+    'queue': None,
+    'plan': [],
+    # The forecast last reconciled, as (timestamps, statuses) arrays, and
+    # its window jobs as (job ID, run time, args) sorted by ID
+    'forecast': None,
+    'windows': [],
+    # Where the jobs start, stop and submit computations: the slot manager
+    # in simulation.py, or a stand-in that runs them in virtual time
+    'computations': simulation,
+}
+
+WINDOW_JOB_PREFIX = 'window_'
+
+
+def create_scheduler(computation_manager, path=SCHEDULE_DB):
+    """A paused scheduler backed by the SQLite job store at ``path``.
+
+    It is started paused so the persisted jobs can be inspected and
+    reconciled before any of them fire; call ``scheduler.resume()`` next.
+    """
+    schedule_state['computation_manager'] = computation_manager
+    schedule_state['forecast'] = None  # The first reconcile reads the store
+    schedule_state['windows'] = []
+    if schedule_state['queue'] is None:
+        # Sample workload until calculations are queued from elsewhere
+        schedule_state['queue'] = WorkQueue(sample_calculations(500))
+    schedule_state['journal'] = ComputationJournal(path)
+    schedule_state['job_store'] = SQLiteJobStore(path)
+    scheduler = BackgroundScheduler(
+        jobstores={'default': schedule_state['job_store']}
+    )
+    scheduler.start(paused=True)
+    return scheduler
+
+
+@timed()
+def schedule_computations(future_df, computation_manager, path=SCHEDULE_DB):
+    scheduler = create_scheduler(computation_manager, path)
+    resume_in_flight()
+    reconcile_schedule(scheduler, future_df)
+    scheduler.resume()
+    print("Computation scheduler started.")
+    return scheduler
+
+
+@timed()
+def resume_schedule(computation_manager, path=SCHEDULE_DB, now=None):
+    """Restart from the persisted plan without a new forecast.
+
+    Windows that started while the process was down are collapsed into
+    the latest one, which fires right away, and the computation that was
+    in flight at shutdown is resumed.
+    """
+    if now is None:
+        now = clock.now()
+    scheduler = create_scheduler(computation_manager, path)
+    resume_in_flight()
+
+    # The store compares UTC timestamps, and a naive now would be read as
+    # UTC; it is local time, as the jobs' run dates were when added
+    now = convert_to_datetime(now, scheduler.timezone, 'now')
+
+    # Only the overdue jobs are loaded, through the next_run_time index
+    job_store = schedule_state['job_store']
+    for job in job_store.get_due_jobs(now)[:-1]:
+        job.remove()
+
+    scheduler.resume()
+    print(f"Computation scheduler resumed with {job_store.count_jobs()} jobs.")
+    return scheduler
+
+
+def resume_in_flight():
+    """Rerun the computations that were running when the process stopped.
+
+    They are marked interrupted in the journal, submitted again and the
+    intensity they ran at is restored.
+    """
+    journal = schedule_state['journal']
+    in_flight = journal.in_flight()
+    if not in_flight:
+        return
+    for computation_id, _, _, _ in in_flight:
+        journal.finish(computation_id, status='interrupted')
+
+    intensity = in_flight[-1][1]
+    schedule_state['active_intensity'] = intensity
+    computations = schedule_state['computations']
+    if intensity is not None:
+        computations.start_intensity_computation(intensity)
+    for _, _, molecule, conformers in in_flight:
+        if molecule in MOLECULES:
+            computations.submit_computation(
+                calculation(molecule, conformers or 1),
+                on_status=record_computation,
+                block=False,
+            )
+    print(f"Resumed {len(in_flight)} interrupted computations at {intensity}.")
+
+
+def window_job_id(start):
+    # IDs sort in time order, so a span of windows is a range of IDs
+    return f'{WINDOW_JOB_PREFIX}{pd.Timestamp(start):%Y%m%dT%H%M}'
+
+
+def window_jobs(future_df, now=None):
+    """Job ID -> (run time, args) for every window that is not over yet.
+
+    Job IDs come from the window's start time, so the same window keeps
+    the same ID across forecasts. The window in progress only gets a job
+    when its intensity differs from the one currently applied.
+    """
+    if now is None:
+        now = clock.now()
+
+    # One job per run of same-intensity slots instead of one per row
+    jobs = {}
+    for window in forecast_windows(future_df).itertuples():
+        start = window.Start.to_pydatetime()
+        if window.End.to_pydatetime() <= now:
+            continue  # Already over
+        if start <= now and window.Intensity == schedule_state['active_intensity']:
+            continue  # Already running at this intensity
+        jobs[window_job_id(start)] = (max(start, now), (window.Intensity,))
+    return jobs
+
+
+def forecast_slots(future_df):
+    return (
+        future_df["Timestamp"].to_numpy(dtype="datetime64[ns]"),
+        future_df["Predicted_Status"].to_numpy(),
+    )
+
+
+def changed_spans(previous, current):
+    """Slot index ranges of ``current`` whose windows may differ from ``previous``.
+
+    Both are ``forecast_slots``. Each slot that is new, changed status or
+    disappeared is widened to the whole windows around it, so the windows
+    outside the ranges are the same in both forecasts. Returns a sorted
+    list of non-overlapping (first, stop) slot indices.
+    """
+    old_ts, old_status = previous
+    ts, status = current
+    if len(ts) == 0:
+        return []
+    slot = SLOT.to_timedelta64()
+
+    changed = np.ones(len(ts), dtype=bool)
+    if len(old_ts):
+        i = np.minimum(np.searchsorted(old_ts, ts), len(old_ts) - 1)
+        changed = (old_ts[i] != ts) | (old_status[i] != status)
+    points = ts[changed]
+    if len(old_ts):
+        j = np.minimum(np.searchsorted(ts, old_ts), len(ts) - 1)
+        dropped = old_ts[(old_ts >= ts[0]) & (ts[j] != old_ts)]
+        points = np.union1d(points, dropped)
+        if old_ts[0] != ts[0]:
+            points = np.union1d(points, ts[:1])  # The first window's start moved
+    if len(points) == 0:
+        return []
+
+    # Window boundaries of the new forecast, as forecast_windows finds them
+    breaks = np.flatnonzero((status[1:] != status[:-1]) | (np.diff(ts) != slot)) + 1
+    starts = np.concatenate([[0], breaks])
+    stops = np.concatenate([breaks, [len(ts)]])
+    # Each point and its neighbouring slots, whose windows may merge with it
+    first = starts[np.maximum(np.searchsorted(ts[starts], points - slot, 'right') - 1, 0)]
+    last = np.searchsorted(ts[starts], points + slot, 'right') - 1
+    stop = stops[np.maximum(last, 0)]
+
+    spans = []
+    for a, b in zip(first, stop):
+        if spans and a <= spans[-1][1]:
+            spans[-1][1] = max(spans[-1][1], b)
+        else:
+            spans.append([a, b])
+    return [(int(a), int(b)) for a, b in spans]
+
+
+def _replace_window_job(scheduler, job_id, run_time, args):
+    scheduler.add_job(
+        run_window,
+        'date',
+        run_date=run_time,
+        id=job_id,
+        args=args,
+        misfire_grace_time=None,
+        replace_existing=True,
+    )
+
+
+def _sync_window_jobs(scheduler, existing, desired, now, changes):
+    """Write the difference between two {job ID: (run time, args)} maps."""
+    for job_id in existing.keys() - desired.keys():
+        try:
+            scheduler.remove_job(job_id)
+        except JobLookupError:
+            pass  # Fired since it was last seen
+        changes['removed'] += 1
+    for job_id, (run_time, args) in desired.items():
+        old = existing.get(job_id)
+        if old is None:
+            _replace_window_job(scheduler, job_id, run_time, args)
+            changes['added'] += 1
+        elif tuple(old[1]) != args or (run_time > now and old[0] != run_time):
+            _replace_window_job(scheduler, job_id, run_time, args)
+            changes['modified'] += 1
+        else:
+            changes['unchanged'] += 1
+
+
+@timed()
+def reconcile_schedule(scheduler, future_df, now=None):
+    """Bring the scheduler's window jobs in line with a new forecast.
+
+    The forecast is compared with the one reconciled last, and only the
+    windows around the slots that changed are recomputed: their jobs are
+    added, modified or removed and their calculations repacked, so a
+    re-forecast costs time proportional to what changed rather than to
+    the horizon. The first reconcile after ``create_scheduler`` has
+    nothing to compare with; it checks every window job in the store and
+    packs the whole queue.
+    """
+    if now is None:
+        now = clock.now()
+    slots = forecast_slots(future_df)
+    changes = {'added': 0, 'modified': 0, 'removed': 0, 'unchanged': 0}
+    windows = schedule_state['windows']
+
+    if schedule_state['forecast'] is None:
+        existing = {
+            job.id: (job.trigger.run_date.replace(tzinfo=None), tuple(job.args))
+            for job in scheduler.get_jobs()
+            if job.id.startswith(WINDOW_JOB_PREFIX)
+        }
+        desired = window_jobs(future_df, now)
+        _sync_window_jobs(scheduler, existing, desired, now, changes)
+        windows[:] = sorted(
+            (job_id, run_time, args) for job_id, (run_time, args) in desired.items()
+        )
+        spans = None
+    else:
+        # Jobs that have fired are no longer in the store
+        fired = 0
+        while fired < len(windows) and windows[fired][1] <= now:
+            fired += 1
+        del windows[:fired]
+
+        spans = changed_spans(schedule_state['forecast'], slots)
+        timestamps = slots[0]
+        for first, stop in spans:
+            # The windows in the span, and the job IDs they had before
+            lo = 0 if first == 0 else bisect.bisect_left(
+                windows, (window_job_id(timestamps[first]),)
             )
-        elif predicted_status == 1:  # Medium Usage
-            scheduler.add_job(
-                start_computation,
-                'date',
-                run_date=run_time,
-                id=job_id,
-                args=[computation_manager, 'MEDIUM']
+            hi = len(windows) if stop == len(timestamps) else bisect.bisect_left(
+                windows, (window_job_id(timestamps[stop]),)
             )
-        elif predicted_status == 2:  # Low Usage
-            scheduler.add_job(
-                start_computation,
-                'date',
-                run_date=run_time,
-                id=job_id,
-                args=[computation_manager, 'LOW']
+            existing = {job_id: (run_time, args) for job_id, run_time, args in windows[lo:hi]}
+            desired = window_jobs(future_df.iloc[first:stop], now)
+            _sync_window_jobs(scheduler, existing, desired, now, changes)
+            windows[lo:hi] = sorted(
+                (job_id, run_time, args) for job_id, (run_time, args) in desired.items()
             )
-            
-    scheduler.start()
-    print("Computation scheduler started.")
+    schedule_state['forecast'] = slots
 
-def start_computation(computation_manager, intensity):
-    # Sample molecules for demonstration
-    molecules = [
-        "Ethane (C2H6)",
-        "Methanol (CH3OH)",
-        "Acetaldehyde (C2H4O)",
-        "Ethanol (C2H5OH)"
-    ]
-    
-    # Update current calculation
-    computation_manager.update_current_calculation(
-        cycle=computation_manager.current_calculation['cycle'] + 1,
-        molecule=random.choice(molecules)
+    for change, amount in changes.items():
+        count(f"jobs_{change}", amount)
+    print(
+        "Schedule reconciled: "
+        + ", ".join(f"{amount} {change}" for change, amount in changes.items())
     )
+    plan_calculations(future_df, now, spans)
+    return changes
+
+
+@timed()
+def plan_calculations(future_df, now=None, spans=None):
+    """Pack the queued calculations into the forecast's idle windows.
+
+    With ``spans`` (see ``changed_spans``), only the windows in them are
+    repacked, with the calculations they held and those no window holds;
+    the rest of the plan is kept. Calculations whose result is already
+    cached need no idle time: they are completed from the cache instead
+    of being packed.
+    """
+    queue = schedule_state['queue']
+    if queue is None:
+        return
+    if now is None:
+        now = clock.now()
+    now = pd.Timestamp(now)
+
+    if spans is None:
+        plan = []
+        frames = future_df
+        candidates = queue.pending()
+    else:
+        plan = [entry for entry in schedule_state['plan'] if entry[1] > now]
+        timestamps = future_df["Timestamp"]
+        frames = future_df.iloc[0:0]
+        if spans:
+            frames = pd.concat([future_df.iloc[first:stop] for first, stop in spans])
+        for first, stop in reversed(spans):
+            end = timestamps.iloc[stop - 1] + SLOT
+            lo = bisect.bisect_left(
+                plan, timestamps.iloc[first], key=lambda entry: entry[1]
+            )
+            hi = bisect.bisect_left(plan, end, key=lambda entry: entry[0])
+            del plan[lo:hi]
+        planned = collections.Counter(
+            calculation for entry in plan for calculation in entry[3]
+        )
+        candidates = []
+        for pending in queue.pending():
+            if planned[pending]:
+                planned[pending] -= 1
+            else:
+                candidates.append(pending)
+
+    served = 0
+    unserved = []
+    for pending in candidates:
+        if result_cache().contains(result_key(pending)) and queue.take(pending):
+            schedule_state['computations'].submit_computation(
+                pending, on_status=record_computation
+            )
+            served += 1
+        else:
+            unserved.append(pending)
+    if served:
+        count("calculations_cached", served)
+        print(f"Served {served} queued calculations from the result cache.")
+
+    packed, stats = pack_schedule(forecast_windows(frames), unserved, now=now)
+    schedule_state['plan'] = sorted(plan + packed, key=lambda entry: entry[0])
+    count("calculations_packed", stats['packed'])
+    print_packing_report(stats)
+
+
+def run_window(intensity):
+    """Job body for a forecast window: switch to its intensity, or stop."""
+    schedule_state['active_intensity'] = intensity
+    computations = schedule_state['computations']
+    if intensity is None:  # Very High Usage
+        computations.stop_computation()
+        return
+
+    # Starts the computations, or resizes them when they are running
+    computations.start_intensity_computation(intensity)
+    start_computation(schedule_state['computation_manager'], intensity)
+
+
+def record_computation(task, status):
+    """Journal each computation and show it on the computation manager."""
+    journal = schedule_state['journal']
+    manager = schedule_state['computation_manager']
+    molecule = task.calculation.molecule
+    if status == 'running':
+        if manager is not None:
+            manager.start_calculation(molecule)
+        if journal is not None:
+            task.journal_id = journal.start(
+                schedule_state['active_intensity'],
+                molecule,
+                task.calculation.conformers,
+            )
+        return
+
+    if journal is not None and task.cached:
+        # Served from the result cache without ever running
+        task.journal_id = journal.start(
+            schedule_state['active_intensity'],
+            molecule,
+            task.calculation.conformers,
+        )
+    if journal is not None and getattr(task, 'journal_id', None) is not None:
+        if task.cached:
+            journal_status = 'cached'
+        elif status == 'cancelled':
+            journal_status = 'stopped'
+        else:
+            journal_status = status
+        journal.finish(
+            task.journal_id,
+            journal_status,
+            score=task.score,
+            cpu_time=task.cpu_seconds,
+        )
+    if status == 'completed' and manager is not None:
+        manager.add_to_history(
+            molecule, task.score, clock.now(), task.cpu_seconds
+        )
+
+def start_computation(computation_manager, intensity):
+    """Submit the calculations packed into the current window.
+
+    When the window got none, the oldest queued calculation runs instead.
+    Calculations the slot manager has no room for go back on the queue.
+    """
+    queue = schedule_state['queue']
+    if queue is None:
+        return
+    planned = assignment_at(schedule_state['plan'], clock.now())
+    calculations = [c for c in map(queue.take, planned) if c is not None]
+    if not calculations:
+        calculations = [c for c in [queue.take()] if c is not None]
 
+    submitted = 0
+    for planned_calculation in calculations:
+        if not schedule_state['computations'].submit_computation(
+            planned_calculation, on_status=record_computation, block=False
+        ):
+            queue.add(planned_calculation)
+            continue
+        submitted += 1
+    print(f"Submitted {submitted} calculations for the {intensity} window.")
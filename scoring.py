@@ -0,0 +1,304 @@
+# scripts/scoring.py
+
+import argparse
+import functools
+import os
+import threading
+import time
+import zlib
+
+import numpy as np
+
+# Lennard-Jones sigma (Å) and epsilon (kcal/mol) of each element (OPLS-AA)
+ATOM_TYPES = {
+    "C": (3.50, 0.066),
+    "H": (2.50, 0.030),
+    "N": (3.25, 0.170),
+    "O": (3.12, 0.170),
+}
+COULOMB = 332.0637  # kcal·Å/(mol·e²)
+
+# Element, partial charge and coordinates (Å) of each atom. Conformers
+# rotate the "rotor" atoms about the bond from atom 0 to atom 1.
+MOLECULE_ATOMS = {
+    "Ethane (C2H6)": {
+        "atoms": [
+            ("C", -0.18, (0.00, 0.00, 0.00)),
+            ("C", -0.18, (1.54, 0.00, 0.00)),
+            ("H", 0.06, (-0.36, 1.03, 0.00)),
+            ("H", 0.06, (-0.36, -0.51, 0.89)),
+            ("H", 0.06, (-0.36, -0.51, -0.89)),
+            ("H", 0.06, (1.90, -1.03, 0.00)),
+            ("H", 0.06, (1.90, 0.51, 0.89)),
+            ("H", 0.06, (1.90, 0.51, -0.89)),
+        ],
+        "rotor": [5, 6, 7],
+    },
+    "Methanol (CH3OH)": {
+        "atoms": [
+            ("C", 0.145, (0.00, 0.00, 0.00)),
+            ("O", -0.683, (1.43, 0.00, 0.00)),
+            ("H", 0.418, (1.75, 0.90, 0.00)),
+            ("H", 0.04, (-0.36, -1.03, 0.00)),
+            ("H", 0.04, (-0.36, 0.51, 0.89)),
+            ("H", 0.04, (-0.36, 0.51, -0.89)),
+        ],
+        "rotor": [2],
+    },
+    "Acetaldehyde (C2H4O)": {
+        "atoms": [
+            ("C", -0.18, (0.00, 0.00, 0.00)),
+            ("C", 0.45, (1.50, 0.00, 0.00)),
+            ("O", -0.45, (2.10, 1.05, 0.00)),
+            ("H", 0.00, (2.05, -0.95, 0.00)),
+            ("H", 0.06, (-0.36, 1.03, 0.00)),
+            ("H", 0.06, (-0.36, -0.51, 0.89)),
+            ("H", 0.06, (-0.36, -0.51, -0.89)),
+        ],
+        "rotor": [2, 3],
+    },
+    "Ethanol (C2H5OH)": {
+        "atoms": [
+            ("C", -0.18, (0.00, 0.00, 0.00)),
+            ("C", 0.145, (1.52, 0.00, 0.00)),
+            ("O", -0.683, (2.00, 1.35, 0.00)),
+            ("H", 0.418, (2.96, 1.33, 0.00)),
+            ("H", 0.06, (1.88, -0.51, 0.89)),
+            ("H", 0.06, (1.88, -0.51, -0.89)),
+            ("H", 0.06, (-0.36, -1.03, 0.00)),
+            ("H", 0.06, (-0.36, 0.51, 0.89)),
+            ("H", 0.06, (-0.36, 0.51, -0.89)),
+        ],
+        "rotor": [2, 3, 4, 5],
+    },
+}
+
+POCKET_ATOMS = 512
+POCKET_SEED = 20240115
+POSES = 1024  # Rigid placements of each conformer in the pocket
+BATCH = 64  # Poses scored per vectorized step
+SCORE_SCALE = 40  # Score points per kcal/mol of the best binding energy
+
+
+@functools.lru_cache(maxsize=None)
+def pocket(atoms=POCKET_ATOMS, seed=POCKET_SEED):
+    """A synthetic binding pocket: atoms on a shell around the origin.
+
+    Returns their coordinates, sigmas, epsilons and charges.
+    """
+    rng = np.random.default_rng(seed)
+    directions = rng.normal(size=(atoms, 3))
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+    coords = directions * rng.uniform(4.5, 9.0, (atoms, 1))
+    elements = rng.choice(["C", "N", "O", "H"], atoms, p=[0.5, 0.15, 0.15, 0.2])
+    sigma, epsilon = np.array([ATOM_TYPES[e] for e in elements]).T
+    charges = rng.uniform(-0.3, 0.3, atoms)
+    return coords, sigma, epsilon, charges
+
+
+def pair_terms(sigma, epsilon, charges):
+    """Per atom pair (molecule x pocket) constants of the energy terms."""
+    _, pocket_sigma, pocket_epsilon, pocket_charges = pocket()
+    # Lorentz-Berthelot mixing
+    sigma6 = ((sigma[:, None] + pocket_sigma[None, :]) / 2) ** 6
+    epsilon4 = 4 * np.sqrt(epsilon[:, None] * pocket_epsilon[None, :])
+    # Distance-dependent dielectric (4r), which makes Coulomb go as 1/r²
+    charge_products = COULOMB / 4 * charges[:, None] * pocket_charges[None, :]
+    return sigma6, epsilon4, charge_products
+
+
+def atom_parameters(molecule):
+    """Sigma, epsilon and charge of each of the molecule's atoms."""
+    atoms = MOLECULE_ATOMS[molecule]["atoms"]
+    sigma, epsilon = np.array([ATOM_TYPES[element] for element, _, _ in atoms]).T
+    charges = np.array([charge for _, charge, _ in atoms])
+    return sigma, epsilon, charges
+
+
+@functools.lru_cache(maxsize=None)
+def _molecule_terms(molecule):
+    return pair_terms(*atom_parameters(molecule))
+
+
+def _seed(molecule, index):
+    return zlib.crc32(f"{molecule}/{index}".encode())
+
+
+def conformers(molecule, indices):
+    """Coordinates of the conformers: the rotor turned about its bond."""
+    spec = MOLECULE_ATOMS[molecule]
+    coords = np.array([xyz for _, _, xyz in spec["atoms"]])
+    angles = 2 * np.pi * np.array(
+        [np.random.default_rng(_seed(molecule, index)).random() for index in indices]
+    )
+    cos = np.cos(angles)[:, None, None]
+    sin = np.sin(angles)[:, None, None]
+    axis = coords[1] - coords[0]
+    axis /= np.linalg.norm(axis)
+    rotor = coords[spec["rotor"]] - coords[1]
+    # Rodrigues' rotation formula
+    rotor = (
+        rotor * cos
+        + np.cross(axis, rotor) * sin
+        + np.outer(rotor @ axis, axis) * (1 - cos)
+    )
+    result = np.repeat(coords[None], len(angles), axis=0)
+    result[:, spec["rotor"]] = rotor + coords[1]
+    return result - result.mean(axis=1, keepdims=True)
+
+
+def conformer(molecule, index):
+    return conformers(molecule, [index])[0]
+
+
+def _rotations(rng, n):
+    """``n`` uniformly random rotation matrices, from unit quaternions."""
+    w, x, y, z = rng.normal(size=(4, n))
+    norm = np.sqrt(w * w + x * x + y * y + z * z)
+    w, x, y, z = w / norm, x / norm, y / norm, z / norm
+    return np.stack(
+        [
+            1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w),
+            2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w),
+            2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y),
+        ],
+        axis=-1,
+    ).reshape(n, 3, 3)
+
+
+def place(coords, rng, n=POSES):
+    """``n`` random rigid placements of ``coords`` near the pocket's centre."""
+    rotations = _rotations(rng, n)
+    shifts = rng.uniform(-1.5, 1.5, (n, 1, 3))
+    return np.einsum("pij,aj->pai", rotations, coords) + shifts
+
+
+def poses(molecule, index, n=POSES):
+    """``n`` placements of a conformer, the same each time it is scored."""
+    rng = np.random.default_rng(_seed(molecule, index))
+    coords = conformer(molecule, index)
+    return place(coords, rng, n)
+
+
+_workspace = threading.local()
+
+
+def _buffers(shape):
+    """Two scratch arrays of ``shape``, kept per thread between calls.
+
+    Fresh arrays the size of the pair grid cost page faults on every
+    call, which dominates when only a few poses are scored at a time.
+    """
+    size = int(np.prod(shape))
+    buffers = getattr(_workspace, "buffers", None)
+    if buffers is None or buffers[0].size < size:
+        buffers = _workspace.buffers = (np.empty(size), np.empty(size))
+    return tuple(buffer[:size].reshape(shape) for buffer in buffers)
+
+
+def interaction_energies(placed, terms):
+    """Lennard-Jones plus Coulomb energy (kcal/mol) of each placement.
+
+    ``placed`` holds the molecule's coordinates in each pose, shape
+    (poses, atoms, 3), and ``terms`` its ``pair_terms``. Poses are scored
+    ``BATCH`` at a time, with the squared distances to every pocket atom
+    from one matrix product. The arithmetic is done in place in two
+    buffers, so no batch allocates anything the size of the pair grid.
+    """
+    sigma6, epsilon4, charge_products = terms
+    pocket_coords = pocket()[0]
+    pocket_norms = (pocket_coords**2).sum(axis=1)
+    grid, s6_grid = _buffers((BATCH, *sigma6.shape))
+    energies = np.empty(len(placed))
+    for start in range(0, len(placed), BATCH):
+        batch = placed[start : start + BATCH]
+        n = len(batch)
+        r2 = np.matmul(batch, -2 * pocket_coords.T, out=grid[:n])
+        r2 += (batch**2).sum(axis=2)[:, :, None]
+        r2 += pocket_norms
+        np.maximum(r2, 1.0, out=r2)  # No closer than 1 Å
+        inv_r2 = np.reciprocal(r2, out=r2)
+        s6 = np.multiply(inv_r2, inv_r2, out=s6_grid[:n])
+        s6 *= inv_r2
+        s6 *= sigma6
+        coulomb = inv_r2.reshape(n, -1) @ charge_products.ravel()
+        # Lennard-Jones is epsilon4 * (s6² - s6) = epsilon4 * s6 * (s6 - 1)
+        s6_less_1 = np.subtract(s6, 1.0, out=grid[:n])
+        s6 *= s6_less_1
+        energies[start : start + n] = s6.reshape(n, -1) @ epsilon4.ravel() + coulomb
+    return energies
+
+
+def score_conformers(molecule, indices, n=POSES):
+    """Best (lowest) energy of each conformer over its ``n`` poses."""
+    placed = np.concatenate([poses(molecule, index, n) for index in indices])
+    energies = interaction_energies(placed, _molecule_terms(molecule))
+    return energies.reshape(len(indices), n).min(axis=1)
+
+
+def score_conformer(molecule, index):
+    """Score one conformer on a worker.
+
+    Returns the CPU-seconds it took and the conformer's best energy.
+    """
+    started = time.process_time()
+    energy = float(score_conformers(molecule, [index])[0])
+    return time.process_time() - started, energy
+
+
+def calculation_score(energies):
+    """The score shown for a calculation: its best energy, in points."""
+    energies = np.asarray(energies, dtype=float)
+    if not len(energies) or np.isnan(energies).all():
+        return None
+    return int(round(-np.nanmin(energies) * SCORE_SCALE))
+
+
+def benchmark(conformers, cores):
+    from engine import ComputationEngine
+    from work_queue import MOLECULES
+
+    print(f"{POSES} poses per conformer against {POCKET_ATOMS} pocket atoms")
+    for molecule in MOLECULES:
+        score_conformers(molecule, [0])  # Warm up the cached terms
+        started = time.process_time()
+        energies = score_conformers(molecule, range(conformers))
+        seconds = time.process_time() - started
+        print(
+            f"{molecule:>21}: {conformers / seconds:7.1f} conformers/s on one "
+            f"core, {seconds / conformers:.3f} CPU-s each (estimated "
+            f"{MOLECULES[molecule]:.3f}), score {calculation_score(energies)}"
+        )
+
+    engine = ComputationEngine(cores)
+    engine.set_intensity("HIGH")
+    # Start the workers up front so their spawn time is not measured
+    for future in [
+        engine.submit(score_conformer, "Ethanol (C2H5OH)", 0)
+        for _ in range(engine.workers)
+    ]:
+        future.result()
+    started = time.perf_counter()
+    futures = [
+        engine.submit(score_conformer, "Ethanol (C2H5OH)", index)
+        for index in range(conformers * engine.workers)
+    ]
+    for future in futures:
+        future.result()
+    seconds = time.perf_counter() - started
+    engine.shutdown()
+    rate = len(futures) / seconds
+    print(
+        f"Engine on {engine.cores} cores: {rate:.1f} conformers/s, "
+        f"{rate / engine.cores:.1f} per core"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure conformer scoring throughput."
+    )
+    parser.add_argument("--conformers", type=int, default=50)
+    parser.add_argument("--cores", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    benchmark(args.conformers, args.cores)
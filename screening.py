@@ -0,0 +1,238 @@
+# scripts/screening.py
+
+import argparse
+import os
+import queue
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+import psutil
+
+from scoring import (
+    MOLECULE_ATOMS,
+    atom_parameters,
+    conformers,
+    interaction_energies,
+    pair_terms,
+    place,
+)
+
+SCREEN_POSES = 64  # Placements per library entry; a screen, not a full score
+SLICE_SIZE = 64  # Library entries per task
+
+MAX_ATOMS = max(len(spec["atoms"]) for spec in MOLECULE_ATOMS.values())
+
+# Arrays of a library, one row per entry (a conformer of a molecule)
+LIBRARY_FIELDS = {
+    "coords": (np.float64, (MAX_ATOMS, 3)),
+    "parameters": (np.float64, (MAX_ATOMS, 3)),  # Sigma, epsilon, charge
+    "atoms": (np.int64, ()),
+    "molecule": (np.int64, ()),
+    "conformer": (np.int64, ()),
+}
+
+
+class SharedLibrary:
+    """A molecule library held in shared memory, one block per field.
+
+    The process that builds it owns the blocks and unlinks them on
+    ``close``. Workers attach to them by name through ``spec`` and read
+    the arrays in place, so the library is never copied per worker.
+    """
+
+    def __init__(self, entries, spec=None):
+        self.entries = entries
+        self.owner = spec is None
+        self._blocks = {}
+        self.arrays = {}
+        for field, (dtype, shape) in LIBRARY_FIELDS.items():
+            shape = (entries, *shape)
+            if self.owner:
+                size = max(int(np.prod(shape)) * np.dtype(dtype).itemsize, 1)
+                block = shared_memory.SharedMemory(create=True, size=size)
+            else:
+                block = shared_memory.SharedMemory(name=spec[field])
+            self._blocks[field] = block
+            self.arrays[field] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    @property
+    def spec(self):
+        """What a worker needs to attach: the entry count and block names."""
+        names = {field: block.name for field, block in self._blocks.items()}
+        return self.entries, names
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in self.arrays.values())
+
+    def close(self):
+        self.arrays = {}
+        for block in self._blocks.values():
+            block.close()
+            if self.owner:
+                block.unlink()
+        self._blocks = {}
+
+
+def build_library(entries, seed=0):
+    """``entries`` random conformers of the known molecules, in shared memory."""
+    rng = np.random.default_rng(seed)
+    molecules = list(MOLECULE_ATOMS)
+    library = SharedLibrary(entries)
+    arrays = library.arrays
+    arrays["molecule"][:] = rng.integers(0, len(molecules), entries)
+    arrays["conformer"][:] = rng.integers(0, 1_000_000, entries)
+    for m, molecule in enumerate(molecules):
+        rows = np.flatnonzero(arrays["molecule"] == m)
+        atoms = len(MOLECULE_ATOMS[molecule]["atoms"])
+        arrays["atoms"][rows] = atoms
+        arrays["parameters"][rows, :atoms] = np.stack(atom_parameters(molecule), -1)
+        arrays["coords"][rows, :atoms] = conformers(molecule, arrays["conformer"][rows])
+    return library
+
+
+# Libraries a worker process has attached to, by their first block's name
+_attached = {}
+
+
+def _attach(spec):
+    entries, names = spec
+    key = names["coords"]
+    if key not in _attached:
+        for previous in _attached.values():
+            previous.close()  # A new library: let go of the old one
+        _attached.clear()
+        _attached[key] = SharedLibrary(entries, names)
+    return _attached[key]
+
+
+def score_slice(spec, start, stop, poses=SCREEN_POSES, seed=0):
+    """Best energy of library entries ``start:stop``, on a worker.
+
+    Returns the CPU-seconds it took and the energies.
+    """
+    started = time.process_time()
+    arrays = _attach(spec).arrays
+    energies = np.empty(stop - start)
+    for i, row in enumerate(range(start, stop)):
+        atoms = arrays["atoms"][row]
+        sigma, epsilon, charges = arrays["parameters"][row, :atoms].T
+        rng = np.random.default_rng([seed, row])
+        placed = place(arrays["coords"][row, :atoms], rng, poses)
+        energies[i] = interaction_energies(
+            placed, pair_terms(sigma, epsilon, charges)
+        ).min()
+    return time.process_time() - started, energies
+
+
+def screen(engine, library, slice_size=SLICE_SIZE, poses=SCREEN_POSES, cancel=None):
+    """Score every library entry on the engine's workers.
+
+    Yields ``(start, energies)`` for each slice as soon as it is scored,
+    so results stream back while later slices are still running. Slices
+    are submitted as the intensity allows, and the screen stops early if
+    ``cancel`` is set.
+    """
+    done = queue.Queue()
+    submitted = 0
+    received = 0
+    for start in range(0, library.entries, slice_size):
+        stop = min(start + slice_size, library.entries)
+        future = engine.submit(
+            score_slice, library.spec, start, stop, poses, cancel=cancel
+        )
+        if future is None:
+            break
+        future.add_done_callback(lambda f, start=start: done.put((start, f)))
+        submitted += 1
+        # Hand back whatever finished while this slice waited for a worker
+        while not done.empty():
+            start_done, finished = done.get()
+            received += 1
+            if not finished.cancelled():
+                yield start_done, finished.result()[1]
+    while received < submitted:
+        start_done, finished = done.get()
+        received += 1
+        if not finished.cancelled():
+            yield start_done, finished.result()[1]
+
+
+def top_hits(library, energies, k=10):
+    """The ``k`` best-scoring entries as (molecule, conformer, energy)."""
+    molecules = list(MOLECULE_ATOMS)
+    best = np.argsort(energies)[:k]
+    return [
+        (
+            molecules[library.arrays["molecule"][row]],
+            int(library.arrays["conformer"][row]),
+            float(energies[row]),
+        )
+        for row in best
+    ]
+
+
+def _worker_uss_mb(engine):
+    total = 0
+    for pid in engine.worker_pids():
+        try:
+            total += psutil.Process(pid).memory_full_info().uss
+        except psutil.NoSuchProcess:
+            pass
+    return total / 2**20 / max(len(engine.worker_pids()), 1)
+
+
+def benchmark(entries, cores):
+    from engine import ComputationEngine
+
+    library = build_library(entries)
+    print(
+        f"Library: {entries} entries, {library.nbytes / 2**20:.1f} MB shared, "
+        f"{SCREEN_POSES} poses each"
+    )
+    counts = sorted({1, *[2**i for i in range(cores.bit_length())], cores})
+    baseline = None
+    try:
+        for workers in [count for count in counts if count <= cores]:
+            engine = ComputationEngine(workers)
+            engine.set_intensity("HIGH")
+            # Start the workers and attach them up front
+            for future in [
+                engine.submit(score_slice, library.spec, 0, 1)
+                for _ in range(engine.workers)
+            ]:
+                future.result()
+
+            energies = np.empty(entries)
+            first = None
+            started = time.perf_counter()
+            for start, slice_energies in screen(engine, library):
+                if first is None:
+                    first = time.perf_counter() - started
+                energies[start : start + len(slice_energies)] = slice_energies
+            seconds = time.perf_counter() - started
+            uss = _worker_uss_mb(engine)
+            engine.shutdown()
+
+            rate = entries / seconds
+            baseline = baseline or rate
+            print(
+                f"{workers:3d} workers: {rate:8.1f} entries/s "
+                f"({rate / baseline / workers:.0%} of linear), first results "
+                f"after {first * 1000:.0f} ms, {uss:.1f} MB private per worker"
+            )
+        for molecule, index, energy in top_hits(library, energies, 3):
+            print(f"  {molecule} conformer {index}: {energy:.2f} kcal/mol")
+    finally:
+        library.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Screen a shared-memory molecule library on the engine."
+    )
+    parser.add_argument("--entries", type=int, default=20000)
+    parser.add_argument("--cores", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    benchmark(args.entries, args.cores)
@@ -1,63 +1,394 @@
 # scripts/simulation.py
 
-import datetime
+import collections
 import threading
 import time
 
-# Use a dictionary to track computation status and intensity
-computation_status = {'running': False, 'intensity': None}
-
-def mock_computation_task(intensity):
-    while computation_status['running']:
-        # Simulate computation work
-        print(f"Computation ({intensity}) running at {datetime.datetime.now()}")
-        # Simulate different workloads based on intensity
-        if intensity == 'HIGH':
-            time.sleep(1)  # Simulate high workload
-        elif intensity == 'MEDIUM':
-            time.sleep(2)  # Simulate medium workload
-        elif intensity == 'LOW':
-            time.sleep(3)  # Simulate low workload
+import clock
+from checkpoint import Checkpoint
+from engine import ComputationEngine
+from instrumentation import count, metric
+from preemption import LoadMonitor
+from result_cache import result_cache, result_key
+from schedule_windows import intensity_cores
+from scoring import calculation_score, score_conformer
+
+STOP_TIMEOUT_S = 5.0
+MAX_QUEUED = 256  # Computations waiting for slots before submit blocks
+
+# Worker processes for the computation; the intensity sets how many are busy
+engine = ComputationEngine()
+# Suspends the workers while the user needs the CPU, whatever the forecast
+load_monitor = LoadMonitor(engine)
+
+class ComputationTask:
+    """One calculation, run on its own thread until done or cancelled.
+
+    Each conformer is scored by ``score_conformer`` on the engine, with at
+    most ``cores`` of them in flight, and the best of their energies gives
+    the calculation's ``score``. ``on_status(task, status)`` is called with "running",
+    then "completed", "cancelled" or "failed". Completed results are
+    cached, and a calculation whose result is cached completes straight
+    from the cache (see ``from_cache``). Finished conformers are recorded
+    in a ``Checkpoint``, so a cancelled calculation resumes where it left
+    off the next time it runs; only the conformers in flight are lost.
+    """
+
+    def __init__(self, calculation, cores=1, on_status=None):
+        self.calculation = calculation
+        self.cores = cores
+        self.on_status = on_status
+        self.status = 'pending'
+        self.cpu_seconds = 0.0
+        self.score = None
+        self.cached = False
+        self.resumed_from = 0  # Conformers already done in the checkpoint
+        self.lost_cpu_seconds = 0.0
+        self._lost_lock = threading.Lock()
+        self._cancelled = threading.Event()
+        # Set when a work unit finishes or the task is cancelled
+        self._wakeup = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"Computation-{calculation.molecule}",
+            daemon=True,
+        )
+
+    def _set_status(self, status):
+        self.status = status
+        if self.on_status is not None:
+            self.on_status(self, status)
+
+    def start(self):
+        self._set_status('running')
+        self._thread.start()
+        return self
+
+    def from_cache(self):
+        """Complete with the cached result, if there is one.
+
+        No CPU time is spent, so ``cpu_seconds`` stays 0; the run that
+        cached the result already accounted for its own.
+        """
+        result = result_cache().get(result_key(self.calculation))
+        if result is None:
+            return False
+        self.score = result['score']
+        self.cached = True
+        self._set_status('completed')
+        return True
+
+    def _run(self):
+        checkpoint = None
+        try:
+            key = result_key(self.calculation)
+            checkpoint = Checkpoint(key, self.calculation.conformers)
+            todo = collections.deque(checkpoint.pending())
+            self.resumed_from = checkpoint.completed
+            self.cpu_seconds = checkpoint.cpu_seconds
+            if self.resumed_from:
+                print(f"Resuming {self.calculation.molecule} from conformer "
+                      f"{self.resumed_from}/{self.calculation.conformers}")
+            pending = {}  # Future -> conformer index
+            while not self._cancelled.is_set() and (todo or pending):
+                while todo and len(pending) < self.cores:
+                    # Blocks while every worker the intensity allows is busy
+                    future = engine.submit(
+                        score_conformer,
+                        self.calculation.molecule,
+                        todo[0],
+                        cancel=self._cancelled,
+                    )
+                    if future is None:
+                        break
+                    future.add_done_callback(lambda _: self._wakeup.set())
+                    pending[future] = todo.popleft()
+                if pending:
+                    self._wakeup.clear()
+                    done = [future for future in pending if future.done()]
+                    if not done:
+                        self._wakeup.wait()
+                        continue
+                    for future in done:
+                        cpu_seconds, energy = future.result()
+                        checkpoint.record(pending.pop(future), cpu_seconds, energy)
+                        self.cpu_seconds += cpu_seconds
+        except Exception as e:
+            print(f"Computation of {self.calculation.molecule} failed: {e}")
+            if checkpoint is not None:
+                checkpoint.close()
+            self._set_status('failed')
+            return
+        if self._cancelled.is_set():
+            checkpoint.close()
+            self._discard(pending, checkpoint.completed)
+            self._set_status('cancelled')
+            return
+        self.score = calculation_score(checkpoint.energies)
+        result_cache().put(key, {'score': self.score, 'cpu_seconds': self.cpu_seconds})
+        checkpoint.remove()
+        self._set_status('completed')
+
+    def _discard(self, pending, completed):
+        """Count the CPU time of the conformers in flight when cancelled.
+
+        Those that had not started are dropped; the rest still finish on
+        their workers, and their CPU time is reported as lost once they do.
+        """
+        running = [future for future in pending if not future.cancel()]
+        remaining = [len(running)]
+
+        def report():
+            count('preemptions')
+            count('lost_cpu_s', self.lost_cpu_seconds)
+            metric('last_preemption_lost_cpu_s', round(self.lost_cpu_seconds, 3))
+            print(f"Preempted {self.calculation.molecule} at conformer "
+                  f"{completed}/{self.calculation.conformers}: "
+                  f"{self.lost_cpu_seconds:.2f} CPU-s lost, "
+                  f"{self.cpu_seconds:.2f} kept in its checkpoint")
+
+        def lost(future):
+            with self._lost_lock:
+                if not future.cancelled() and future.exception() is None:
+                    self.lost_cpu_seconds += future.result()[0]
+                remaining[0] -= 1
+                if remaining[0]:
+                    return
+            report()
+
+        if not running:
+            report()
+        for future in running:
+            future.add_done_callback(lost)
+
+    def cancel(self):
+        self._cancelled.set()
+        self._wakeup.set()
+        engine.wake()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def join(self, timeout=None):
+        """Wait for the task's thread; True once it has exited."""
+        self._thread.join(timeout)
+        return not self._thread.is_alive()
+
+    @property
+    def alive(self):
+        return self._thread.is_alive()
+
+class SlotManager:
+    """Runs several computations at once within the intensity's CPU budget.
+
+    The budget is the cores the intensity allows (see ``intensity_cores``)
+    and each running computation holds ``cores`` of them. Computations
+    that do not fit wait in a FIFO of at most ``max_queued``; when it is
+    full, ``submit`` blocks, so producers slow down instead of piling up
+    work. Lowering the budget cancels the newest computations and puts
+    them back at the front of the queue.
+    """
+
+    def __init__(self, engine, max_queued=MAX_QUEUED):
+        self.engine = engine
+        self.max_queued = max_queued
+        self.intensity = None
+        self._budget = 0
+        self._running = []
+        self._cancelled = []  # Preempted, until their threads exit
+        self._queued = collections.deque()
+        self._changed = threading.Condition()
+
+    def _used(self):
+        return sum(task.cores for task in self._running)
+
+    def status(self):
+        with self._changed:
+            return {
+                'intensity': self.intensity,
+                'budget': self._budget,
+                'used': self._used(),
+                'running': len(self._running),
+                'queued': len(self._queued),
+            }
+
+    def set_intensity(self, intensity):
+        with self._changed:
+            self.intensity = intensity
+            self._budget = intensity_cores(intensity, self.engine.cores)
+            self.engine.set_intensity(intensity)
+            while self._running and self._used() > self._budget:
+                task = self._running.pop()
+                task.cancel()
+                self._cancelled.append(task)
+                self._queued.appendleft(task.entry)
+            self._admit()
+
+    def submit(self, calculation, cores=1, on_status=None, block=True, timeout=None):
+        """Queue ``calculation`` to run once ``cores`` of the budget are free.
+
+        A calculation whose result is cached completes right away instead.
+        Returns False if the queue stayed full (immediately when not
+        ``block``ing, else after ``timeout`` seconds).
+        """
+        if cores > self.engine.cores:
+            raise ValueError(
+                f"A computation cannot use {cores} of {self.engine.cores} cores"
+            )
+        if result_cache().contains(result_key(calculation)):
+            # Only a hit needs a task, to report as completed
+            if ComputationTask(calculation, cores, on_status).from_cache():
+                return True
+
+        def has_room():
+            return len(self._queued) < self.max_queued
+
+        with self._changed:
+            if block:
+                self._changed.wait_for(has_room, timeout)
+            if not has_room():
+                return False
+            self._queued.append((calculation, cores, on_status))
+            self._admit()
+            return True
+
+    def _admit(self):
+        # Strict FIFO: a big computation at the front is not overtaken
+        while self._queued and self._used() + self._queued[0][1] <= self._budget:
+            entry = self._queued.popleft()
+            calculation, cores, on_status = entry
+
+            def finished(task, status, on_status=on_status):
+                if status != 'running':
+                    self._finished(task)
+                if on_status is not None:
+                    on_status(task, status)
+
+            task = ComputationTask(calculation, cores, finished)
+            task.entry = entry  # Requeued as is if the task is preempted
+            self._running.append(task)
+            task.start()
+        self._changed.notify_all()
+
+    def _finished(self, task):
+        with self._changed:
+            if task in self._running:
+                self._running.remove(task)
+            if task in self._cancelled:
+                self._cancelled.remove(task)
+            self._admit()
+
+    def join(self, timeout=None):
+        """Wait for the computations' threads to exit; True if they all did."""
+        deadline = None if timeout is None else time.perf_counter() + timeout
+        with self._changed:
+            tasks = self._running + self._cancelled
+        for task in tasks:
+            if deadline is None:
+                task.join()
+            else:
+                task.join(max(deadline - time.perf_counter(), 0))
+        return not any(task.alive for task in tasks)
+
+    def cancel_queued(self):
+        with self._changed:
+            queued = list(self._queued)
+            self._queued.clear()
+            self._changed.notify_all()
+        return [calculation for calculation, _, _ in queued]
+
+slots = SlotManager(engine)
+
+# Start and stop come from both the GUI and the scheduler's threads
+_control_lock = threading.RLock()
+
+def start_intensity_computation(intensity):
+    """Run queued computations at ``intensity``, resizing if already running."""
+    with _control_lock:
+        previous = slots.intensity
+        if previous == intensity:
+            return
+        slots.set_intensity(intensity)
+        load_monitor.start()
+        if previous is None:
+            print(f"{intensity.capitalize()}-intensity computation started at {clock.now()}")
         else:
-            time.sleep(4)  # Default case
-    print("Computation task ended.")
-
-def start_high_intensity_computation():
-    if not computation_status['running']:
-        computation_status['running'] = True
-        computation_status['intensity'] = 'HIGH'
-        print(f"High-intensity computation started at {datetime.datetime.now()}")
-        # Start a mock computation task
-        computation_thread = threading.Thread(target=mock_computation_task, args=('HIGH',))
-        computation_thread.start()
-    else:
-        print("Computation is already running.")
-
-def start_medium_intensity_computation():
-    if not computation_status['running']:
-        computation_status['running'] = True
-        computation_status['intensity'] = 'MEDIUM'
-        print(f"Medium-intensity computation started at {datetime.datetime.now()}")
-        # Start a mock computation task
-        computation_thread = threading.Thread(target=mock_computation_task, args=('MEDIUM',))
-        computation_thread.start()
-    else:
-        print("Computation is already running.")
-
-def start_low_intensity_computation():
-    if not computation_status['running']:
-        computation_status['running'] = True
-        computation_status['intensity'] = 'LOW'
-        print(f"Low-intensity computation started at {datetime.datetime.now()}")
-        # Start a mock computation task
-        computation_thread = threading.Thread(target=mock_computation_task, args=('LOW',))
-        computation_thread.start()
-    else:
-        print("Computation is already running.")
-
-def stop_computation():
-    if computation_status['running']:
-        computation_status['running'] = False
-        print(f"Computation stopped at {datetime.datetime.now()}")
-    else:
-        print("No computation is running.")
+            print(f"Computation switched to {intensity} ({slots.status()['budget']} cores) at {clock.now()}")
+
+def submit_computation(calculation, on_status=None, cores=1, block=True, timeout=None):
+    return slots.submit(calculation, cores, on_status, block=block, timeout=timeout)
+
+def stop_computation(timeout=STOP_TIMEOUT_S):
+    """Cancel the running computations and wait for their threads to exit.
+
+    They go back to the front of the queue for the next start. Returns the
+    seconds it took, or None when nothing was running.
+    """
+    with _control_lock:
+        if slots.intensity is None:
+            print("No computation is running.")
+            return None
+        started = time.perf_counter()
+        slots.set_intensity(None)
+        if not slots.join(timeout):
+            print(f"Computation threads did not exit within {timeout}s.")
+        load_monitor.stop()
+        elapsed = time.perf_counter() - started
+        print(f"Computation stopped at {clock.now()} ({elapsed * 1000:.1f} ms)")
+        return elapsed
+
+def benchmark(calculations=200, cycles=50):
+    from work_queue import calculation
+
+    # Many single-conformer computations at once under the HIGH budget
+    completed = []
+    peak = [0]
+
+    def on_status(task, status):
+        if status == 'completed':
+            completed.append(task)
+        peak[0] = max(peak[0], slots.status()['running'])
+
+    slots.max_queued = 32
+    started = time.perf_counter()
+    start_intensity_computation('HIGH')
+    for i in range(calculations):
+        submit_computation(calculation("Ethane (C2H6)"), on_status)
+    while len(completed) < calculations:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    stop_computation()
+    print(f"Cores: {engine.cores}, computations: {calculations}, "
+          f"peak running: {peak[0]}, {calculations / elapsed:.1f} computations/s")
+
+    # Start and stop from two threads at once
+    threads_before = threading.active_count()
+    latencies = []
+
+    def churn(offset):
+        intensities = ['HIGH', 'MEDIUM', 'LOW']
+        for i in range(cycles):
+            start_intensity_computation(intensities[(i + offset) % 3])
+            submit_computation(calculation("Ethanol (C2H5OH)", 8), block=False)
+            time.sleep(0.02)
+            elapsed = stop_computation()
+            if elapsed is not None:
+                latencies.append(elapsed)
+
+    churners = [threading.Thread(target=churn, args=(n,)) for n in range(2)]
+    for churner in churners:
+        churner.start()
+    for churner in churners:
+        churner.join()
+    slots.cancel_queued()
+    engine.shutdown()
+
+    latencies.sort()
+    print(f"Stops: {len(latencies)}")
+    print(f"Stop latency: median {latencies[len(latencies) // 2] * 1000:.2f} ms, "
+          f"max {latencies[-1] * 1000:.2f} ms")
+    print(f"Threads before: {threads_before}, after: {threading.active_count()}")
+
+if __name__ == '__main__':
+    benchmark()
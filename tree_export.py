@@ -0,0 +1,267 @@
+# scripts/tree_export.py
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+TREES_PATH = os.path.join("models", "idle_time_predictor.trees.npz")
+
+
+def _parse_base_score(value, num_class):
+    # Stored as "5E-1" by older XGBoost and "[a,b,...]" per class by newer ones
+    values = [float(v) for v in value.strip("[]").split(",")]
+    return np.broadcast_to(np.asarray(values, dtype=np.float32), (num_class,)).copy()
+
+
+class TreeEnsemble:
+    """A boosted tree model flattened into NumPy arrays.
+
+    Every node of every tree lives in one set of parallel arrays (feature,
+    threshold, left, right, value, default_left); ``roots`` holds the index
+    of each tree's root and ``tree_class`` the class its leaves vote for.
+    Predicting needs nothing but NumPy, so processes that only forecast do
+    not have to import xgboost or sklearn.
+    """
+
+    ARRAYS = [
+        "feature",
+        "threshold",
+        "left",
+        "right",
+        "value",
+        "default_left",
+        "roots",
+        "tree_class",
+        "base_score",
+    ]
+
+    def __init__(
+        self,
+        feature,
+        threshold,
+        left,
+        right,
+        value,
+        default_left,
+        roots,
+        tree_class,
+        base_score,
+        feature_names,
+        version=None,
+    ):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.default_left = default_left
+        self.roots = roots
+        self.tree_class = tree_class
+        self.base_score = base_score
+        self.feature_names = list(feature_names)
+        self.version = version
+        self.num_class = len(base_score)
+        self.depth = self._max_depth()
+        self._flat_children = None
+
+    @classmethod
+    def from_xgboost(cls, model, version=None):
+        """Flatten a fitted XGBClassifier (or its Booster)."""
+        booster = model.get_booster() if hasattr(model, "get_booster") else model
+        learner = json.loads(bytes(booster.save_raw("json")))["learner"]
+        trees = learner["gradient_booster"]["model"]["trees"]
+        num_class = max(int(learner["learner_model_param"]["num_class"]), 1)
+
+        sizes = np.array([len(tree["left_children"]) for tree in trees])
+        roots = np.concatenate([[0], np.cumsum(sizes)[:-1]]).astype(np.int32)
+
+        def stack(key, dtype):
+            return np.concatenate(
+                [np.asarray(tree[key], dtype=dtype) for tree in trees]
+            )
+
+        left = stack("left_children", np.int32)
+        right = stack("right_children", np.int32)
+        is_leaf = left == -1
+        # Child indices are local to each tree; make them global
+        offsets = np.repeat(roots, sizes)
+        left = np.where(is_leaf, -1, left + offsets).astype(np.int32)
+        right = np.where(is_leaf, -1, right + offsets).astype(np.int32)
+        # Leaves keep their output in split_conditions
+        conditions = stack("split_conditions", np.float32)
+
+        return cls(
+            feature=stack("split_indices", np.int32),
+            threshold=np.where(is_leaf, np.float32(0), conditions),
+            left=left,
+            right=right,
+            value=np.where(is_leaf, conditions, np.float32(0)),
+            default_left=stack("default_left", np.bool_),
+            roots=roots,
+            tree_class=np.asarray(
+                learner["gradient_booster"]["model"]["tree_info"], dtype=np.int32
+            ),
+            base_score=_parse_base_score(
+                learner["learner_model_param"]["base_score"], num_class
+            ),
+            feature_names=learner.get("feature_names") or [],
+            version=version,
+        )
+
+    @classmethod
+    def load(cls, path=TREES_PATH):
+        with np.load(path) as saved:
+            arrays = {name: saved[name] for name in cls.ARRAYS}
+            feature_names = [str(name) for name in saved["feature_names"]]
+            version = str(saved["version"]) if saved["version"].size else None
+        return cls(feature_names=feature_names, version=version, **arrays)
+
+    def save(self, path=TREES_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written aside and renamed, so a crash never leaves a partial export
+        with open(path + ".tmp", "wb") as f:
+            np.savez(
+                f,
+                feature_names=np.asarray(self.feature_names),
+                version=np.asarray(self.version if self.version else []),
+                **{name: getattr(self, name) for name in self.ARRAYS},
+            )
+        os.replace(path + ".tmp", path)
+
+    def _max_depth(self):
+        depth = 0
+        nodes = self.roots
+        while nodes.size:
+            children = np.concatenate([self.left[nodes], self.right[nodes]])
+            nodes = children[children >= 0]
+            depth += 1
+        return depth
+
+    def _as_matrix(self, X):
+        if hasattr(X, "columns"):
+            if self.feature_names:
+                X = X[self.feature_names]
+            X = X.to_numpy()
+        # XGBoost compares features as float32
+        return np.asarray(X, dtype=np.float32)
+
+    def _children(self):
+        # (left, right) per node as one flat array; leaves point at
+        # themselves so finished walks stay put without a separate check
+        if self._flat_children is None:
+            own = np.arange(len(self.left), dtype=np.int32)
+            is_leaf = self.left == -1
+            children = np.empty((len(self.left), 2), dtype=np.int32)
+            children[:, 0] = np.where(is_leaf, own, self.left)
+            children[:, 1] = np.where(is_leaf, own, self.right)
+            self._flat_children = children.ravel()
+        return self._flat_children
+
+    def predict_margin(self, X):
+        X = self._as_matrix(X)
+        children = self._children()
+        has_missing = np.isnan(X).any()
+        flat_X = X.ravel()
+        row_starts = (np.arange(len(X), dtype=np.int64) * X.shape[1])[:, None]
+        nodes = np.broadcast_to(self.roots, (len(X), len(self.roots))).copy()
+
+        # Walk every (row, tree) pair down one level per step
+        for _ in range(self.depth - 1):
+            values = flat_X[row_starts + self.feature[nodes]]
+            go_right = ~(values < self.threshold[nodes])
+            if has_missing:
+                go_right &= ~(np.isnan(values) & self.default_left[nodes])
+            nodes = children[nodes * 2 + go_right]
+
+        margin = np.tile(self.base_score, (len(X), 1))
+        leaves = self.value[nodes]
+        for cls in range(self.num_class):
+            margin[:, cls] += leaves[:, self.tree_class == cls].sum(axis=1)
+        return margin
+
+    def predict(self, X):
+        """Class predictions, matching XGBClassifier.predict for multi:softmax."""
+        return self.predict_margin(X).argmax(axis=1)
+
+
+def exported_version(path=TREES_PATH):
+    """Version of the model exported to ``path``, or None if there is none."""
+    try:
+        with np.load(path) as saved:
+            return str(saved["version"]) if saved["version"].size else None
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def export_trees(model, path=TREES_PATH, version=None):
+    ensemble = TreeEnsemble.from_xgboost(model, version=version)
+    ensemble.save(path)
+    return ensemble
+
+
+def _startup_cost(imports):
+    """Wall time and RSS of a fresh interpreter that runs ``imports``."""
+    import subprocess
+    import sys
+
+    code = (
+        "import time; started = time.perf_counter(); "
+        f"{imports}; "
+        "import psutil; "
+        "print(time.perf_counter() - started, psutil.Process().memory_info().rss)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout.split()
+    return float(output[0]), int(output[1]) / 1e6
+
+
+def benchmark(model_path, rows):
+    import tempfile
+
+    import joblib
+    import pandas as pd
+
+    from features import FEATURE_COLS, calendar_features
+
+    model = joblib.load(model_path)
+    trees_path = os.path.join(tempfile.mkdtemp(), "trees.npz")
+    ensemble = export_trees(model, path=trees_path)
+    timestamps = pd.date_range("2024-01-01", periods=rows, freq="min")
+    X = pd.DataFrame(calendar_features(timestamps))[FEATURE_COLS]
+
+    started = time.perf_counter()
+    expected = model.predict(X)
+    xgboost_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    predicted = ensemble.predict(X)
+    numpy_seconds = time.perf_counter() - started
+
+    mismatches = int(np.count_nonzero(expected != predicted))
+    print(f"Trees: {len(ensemble.roots)}, nodes: {len(ensemble.feature)}")
+    print(f"Rows: {rows:,}, mismatches: {mismatches}")
+    print(f"XGBClassifier.predict: {xgboost_seconds * 1000:8.1f} ms")
+    print(f"TreeEnsemble.predict:  {numpy_seconds * 1000:8.1f} ms")
+
+    heavy = _startup_cost(
+        f"import joblib, xgboost, sklearn.model_selection; joblib.load({model_path!r})"
+    )
+    light = _startup_cost(
+        f"import tree_export; tree_export.TreeEnsemble.load({trees_path!r})"
+    )
+    print(f"Startup with xgboost: {heavy[0]:6.2f}s {heavy[1]:8.1f} MB RSS")
+    print(f"Startup with NumPy:   {light[0]:6.2f}s {light[1]:8.1f} MB RSS")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check the NumPy tree evaluator.")
+    parser.add_argument(
+        "--model", default=os.path.join("models", "idle_time_predictor.pkl")
+    )
+    parser.add_argument("--rows", type=int, default=672)  # One week of slots
+    args = parser.parse_args()
+    benchmark(args.model, args.rows)
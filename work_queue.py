@@ -0,0 +1,243 @@
+# scripts/work_queue.py
+
+import argparse
+import bisect
+import collections
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import clock
+from schedule_windows import forecast_windows, intensity_cores
+
+# Single-core CPU-seconds to score one conformer of each molecule, as
+# measured by the scoring kernel's benchmark (python scoring.py)
+MOLECULES = {
+    "Ethane (C2H6)": 0.036,
+    "Methanol (CH3OH)": 0.026,
+    "Acetaldehyde (C2H4O)": 0.028,
+    "Ethanol (C2H5OH)": 0.036,
+}
+
+# Windows calculations are packed into: predicted Idle and Medium Usage
+PACKED_INTENSITIES = ("HIGH", "MEDIUM")
+
+RESOLUTION_S = 5  # Knapsack capacity granularity, in CPU-seconds
+LOOKAHEAD = 64  # Oldest queued calculations considered for each core
+
+Calculation = collections.namedtuple(
+    "Calculation", ["molecule", "conformers", "cpu_seconds", "priority"]
+)
+
+
+def calculation(molecule, conformers=1, priority=1.0):
+    """A calculation with its CPU cost estimated from ``MOLECULES``."""
+    return Calculation(
+        molecule, conformers, MOLECULES[molecule] * conformers, priority
+    )
+
+
+def sample_calculations(n, rng=None):
+    """``n`` calculations of random molecules and conformer counts.
+
+    A calculation scores 2,000 to 30,000 conformers, about 1 to 18
+    CPU-minutes.
+    """
+    rng = np.random.default_rng(rng)
+    molecules = list(MOLECULES)
+    return [
+        calculation(molecules[m], int(c))
+        for m, c in zip(
+            rng.integers(0, len(molecules), n), rng.integers(2000, 30001, n)
+        )
+    ]
+
+
+class WorkQueue:
+    """Pending molecule calculations, oldest first.
+
+    Shared by the Qt thread and the scheduler's threads, so every access
+    takes the lock.
+    """
+
+    def __init__(self, calculations=()):
+        self._lock = threading.Lock()
+        self._pending = list(calculations)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._pending)
+
+    def add(self, calculation):
+        with self._lock:
+            self._pending.append(calculation)
+
+    def pending(self):
+        with self._lock:
+            return list(self._pending)
+
+    def take(self, calculation=None):
+        """Remove ``calculation`` (or the oldest one) and return it.
+
+        Returns None when it is no longer queued.
+        """
+        with self._lock:
+            if calculation is None:
+                return self._pending.pop(0) if self._pending else None
+            try:
+                self._pending.remove(calculation)
+            except ValueError:
+                return None
+            return calculation
+
+
+def knapsack(costs, values, capacity):
+    """Indices of the items worth the most in total that fit in ``capacity``.
+
+    0/1 knapsack by dynamic programming over capacity in RESOLUTION_S
+    steps; each item's row of the table is updated in one NumPy operation.
+    """
+    weights = np.ceil(np.asarray(costs) / RESOLUTION_S).astype(np.int64)
+    size = int(capacity // RESOLUTION_S)
+    best = np.zeros(size + 1)
+    taken = np.zeros((len(weights), size + 1), dtype=bool)
+    for i, (weight, value) in enumerate(zip(weights, values)):
+        if weight > size:
+            continue
+        candidate = best[: size + 1 - weight] + value
+        improved = candidate > best[weight:]
+        taken[i, weight:] = improved
+        best[weight:] = np.where(improved, candidate, best[weight:])
+
+    chosen = []
+    remaining = size
+    for i in range(len(weights) - 1, -1, -1):
+        if taken[i, remaining]:
+            chosen.append(i)
+            remaining -= weights[i]
+    return chosen[::-1]
+
+
+def first_fit_decreasing(costs, values, capacity):
+    """Greedy alternative to ``knapsack``: most valuable items first."""
+    chosen = []
+    remaining = capacity
+    for i in np.argsort(-np.asarray(values), kind="stable"):
+        if costs[i] <= remaining:
+            chosen.append(int(i))
+            remaining -= costs[i]
+    return sorted(chosen)
+
+
+PACKERS = {"dp": knapsack, "greedy": first_fit_decreasing}
+
+
+def pack_schedule(windows, calculations, cores=None, now=None, method="dp"):
+    """Assign queued calculations to the forecast windows they fit in.
+
+    Each core a window's intensity allows (see ``intensity_cores``) is a
+    lane as long as the window, filled with calculations whose estimated
+    single-core CPU time fits. Windows are filled in time order and each
+    calculation is worth its CPU time times its priority.
+
+    Returns the plan, a list of (start, end, intensity, calculations)
+    sorted by start, and the capacity figures behind it.
+    """
+    if now is None:
+        now = pd.Timestamp(clock.now())
+    pack = PACKERS[method]
+    pending = list(calculations)
+    plan = []
+    capacity = used = 0.0
+
+    for window in windows.itertuples():
+        if window.Intensity not in PACKED_INTENSITIES or window.End <= now:
+            continue
+        start = max(window.Start, now)
+        seconds = (window.End - start).total_seconds()
+        lanes = intensity_cores(window.Intensity, cores)
+        capacity += lanes * seconds
+
+        assigned = []
+        for _ in range(lanes):
+            candidates = pending[:LOOKAHEAD]
+            costs = [c.cpu_seconds for c in candidates]
+            values = [c.cpu_seconds * c.priority for c in candidates]
+            chosen = pack(costs, values, seconds)
+            if not chosen:
+                break  # Every lane of the window is the same length
+            assigned.extend(candidates[i] for i in chosen)
+            chosen = set(chosen)
+            pending = [c for i, c in enumerate(pending) if i not in chosen]
+
+        if assigned:
+            used += sum(c.cpu_seconds for c in assigned)
+            plan.append((start, window.End, window.Intensity, assigned))
+
+    stats = {
+        "capacity_s": capacity,
+        "used_s": used,
+        "utilization": used / capacity if capacity else 0.0,
+        "packed": len(calculations) - len(pending),
+        "unpacked": len(pending),
+    }
+    return plan, stats
+
+
+def assignment_at(plan, timestamp):
+    """Calculations planned for the window that contains ``timestamp``."""
+    timestamp = pd.Timestamp(timestamp)
+    i = bisect.bisect_right([start for start, _, _, _ in plan], timestamp) - 1
+    if i >= 0 and timestamp < plan[i][1]:
+        return plan[i][3]
+    return []
+
+
+def print_packing_report(stats):
+    print(
+        f"Packed {stats['packed']} calculations ({stats['unpacked']} left queued): "
+        f"{stats['used_s'] / 3600:.1f} of {stats['capacity_s'] / 3600:.1f} "
+        f"CPU-hours of forecast idle capacity used ({stats['utilization']:.1%})."
+    )
+
+
+def benchmark(calculations, cores, periods):
+    from schedule_windows import _benchmark_forecast
+
+    future_df = _benchmark_forecast(periods)
+    windows = forecast_windows(future_df)
+    queue = sample_calculations(calculations, rng=0)
+    now = future_df["Timestamp"].iloc[0]
+
+    # What start_computation did before: one random molecule per window
+    rng = np.random.default_rng(0)
+    capacity = used = 0.0
+    for window in windows.itertuples():
+        if window.Intensity in PACKED_INTENSITIES:
+            seconds = (window.End - window.Start).total_seconds()
+            capacity += intensity_cores(window.Intensity, cores) * seconds
+            used += min(queue[rng.integers(len(queue))].cpu_seconds, seconds)
+    print(f"Windows: {len(windows)}, queued calculations: {len(queue)}")
+    print(f"one per window: {used / capacity:7.1%} of capacity used")
+
+    for method in PACKERS:
+        started = time.perf_counter()
+        _, stats = pack_schedule(windows, queue, cores=cores, now=now, method=method)
+        seconds = time.perf_counter() - started
+        print(
+            f"{method:>14}: {stats['utilization']:7.1%} of capacity used, "
+            f"{stats['packed']} packed, {seconds:.3f}s"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Compare packing queued calculations into forecast windows."
+    )
+    parser.add_argument("--calculations", type=int, default=2000)
+    parser.add_argument("--cores", type=int, default=None)
+    parser.add_argument("--periods", type=int, default=96 * 7)  # One week
+    args = parser.parse_args()
+    benchmark(args.calculations, args.cores, args.periods)